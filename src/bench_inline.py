@@ -0,0 +1,60 @@
+import sys
+import timeit
+
+from inline_markdown import (
+    split_nodes_delimiter,
+    split_nodes_image,
+    split_nodes_link,
+    text_to_textnodes,
+)
+from textnode import TextNode, TextType
+
+# Compares the nested inline tokenizer with the old five-pass pipeline on
+# link-heavy paragraphs. Usage: python3 src/bench_inline.py [links ...]
+
+
+def five_pass_textnodes(text):
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+def make_paragraph(links, mixed):
+    parts = []
+    for i in range(links):
+        if not mixed:
+            parts.append(f"see [page {i}](/blog/post-{i})")
+            continue
+        if i % 10 == 0:
+            parts.append(f"![figure {i}](/images/{i}.png) with **bold {i}**")
+        parts.append(f"see [page {i}](/blog/post-{i}) or `code {i}`")
+    return " and ".join(parts)
+
+
+def measure(func, text):
+    runs, total = timeit.Timer(lambda: func(text)).autorange()
+    return total / runs
+
+
+def main(argv):
+    counts = [int(arg) for arg in argv] or [10, 100, 500, 1000, 5000]
+    print(f"{'shape':>6} {'links':>6} {'KiB':>7} {'five-pass MB/s':>15} {'nested MB/s':>17} {'speedup':>8}")
+    for mixed in (False, True):
+        for links in counts:
+            text = make_paragraph(links, mixed)
+            assert text_to_textnodes(text) == five_pass_textnodes(text)
+            megabytes = len(text.encode()) / 1e6
+            old = measure(five_pass_textnodes, text)
+            new = measure(text_to_textnodes, text)
+            print(
+                f"{'mixed' if mixed else 'links':>6} {links:>6} {len(text) / 1024:>7.1f} "
+                f"{megabytes / old:>15.2f} {megabytes / new:>17.2f} {old / new:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
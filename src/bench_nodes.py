@@ -0,0 +1,43 @@
+import sys
+import timeit
+import tracemalloc
+
+from markdown_blocks import markdown_to_html_node
+
+# Measures memory held by the node tree of a large page and how long it takes
+# to build. Usage: python3 src/bench_nodes.py [paragraphs]
+
+
+def make_document(paragraphs):
+    blocks = []
+    for i in range(paragraphs):
+        blocks.append(f"## Section {i}")
+        blocks.append(
+            f"Some **bold {i}** text, _italic_ words, `code {i}` and a "
+            f"[link](/blog/post-{i}) next to ![an image](/images/{i}.png) again."
+        )
+        blocks.append(f"- item _{i}_\n- item **{i + 1}**\n- [item](/x/{i})")
+    return "\n\n".join(blocks)
+
+
+def main(argv):
+    paragraphs = int(argv[0]) if argv else 5000
+    markdown = make_document(paragraphs)
+
+    tracemalloc.start()
+    node = markdown_to_html_node(markdown)
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del node
+
+    runs, total = timeit.Timer(lambda: markdown_to_html_node(markdown)).autorange()
+    print(f"input:          {len(markdown) / 1e6:.2f} MB, {paragraphs} sections")
+    print(f"tree retained:  {current / 1e6:.2f} MB")
+    print(f"tree objects:   {blocks} allocations")
+    print(f"build peak:     {peak / 1e6:.2f} MB")
+    print(f"build time:     {total / runs * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
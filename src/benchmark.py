@@ -0,0 +1,122 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from corpus import add_corpus_arguments, generate_corpus, spec_from_args
+from inline_markdown import text_to_textnodes
+from main import build
+from markdown_blocks import (
+    BlockType,
+    generate_page,
+    markdown_to_html_node,
+    parse_blocks,
+)
+
+# Runs each stage of the pipeline over a synthetic corpus and reports
+# throughput and peak memory. Usage: python3 src/benchmark.py --pages 1000
+
+
+def inline_texts(block):
+    # The strings markdown_to_html_node hands to text_to_textnodes
+    if block.block_type in (BlockType.PARAGRAPH, BlockType.QUOTE):
+        return [" ".join(block.content)]
+    if block.block_type == BlockType.HEADING:
+        return [block.content]
+    if block.block_type in (BlockType.ULIST, BlockType.OLIST):
+        return block.content
+    return []
+
+
+def measure(func):
+    # Time without tracemalloc (it slows allocation down), then run again
+    # under tracemalloc for the peak the stage adds on top of its inputs
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func()
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(root, pages):
+    content_dir = os.path.join(root, "content")
+    template_path = os.path.join(root, "template.html")
+    md_paths = []
+    for dirpath, _, files in os.walk(content_dir):
+        md_paths.extend(os.path.join(dirpath, file) for file in files if file.endswith(".md"))
+    md_paths.sort()
+
+    texts = []
+    def read_files():
+        texts.clear()
+        for path in md_paths:
+            with open(path) as file:
+                texts.append(file.read())
+    results = [("read files", *measure(read_files))]
+    megabytes = sum(len(text.encode()) for text in texts) / 1e6
+
+    results.append(("parse_blocks", *measure(lambda: [list(parse_blocks(text.split("\n"))) for text in texts])))
+    blocks = [block for text in texts for block in parse_blocks(text.split("\n"))]
+    inline = [text for block in blocks for text in inline_texts(block)]
+
+    results.append(("text_to_textnodes", *measure(lambda: [text_to_textnodes(text) for text in inline])))
+    results.append(("markdown_to_html_node", *measure(lambda: [markdown_to_html_node(text) for text in texts])))
+    trees = [markdown_to_html_node(text) for text in texts]
+
+    results.append(("to_html", *measure(lambda: [tree.to_html() for tree in trees])))
+    del trees
+
+    out_dir = os.path.join(root, "pages-out")
+    def write_pages():
+        for path in md_paths:
+            rel_path = os.path.relpath(path, content_dir)
+            generate_page(path, template_path, os.path.join(out_dir, rel_path[:-3] + ".html"), "/")
+    results.append(("generate_page", *measure(write_pages)))
+
+    def full_build():
+        shutil.rmtree(os.path.join(root, "docs"), ignore_errors=True)
+        build(root)
+    results.append(("build (clean)", *measure(full_build)))
+    results.append(("build (no changes)", *measure(lambda: build(root))))
+    return results, megabytes
+
+
+def report(results, pages, megabytes):
+    print(f"{pages} pages, {megabytes:.2f} MB of markdown")
+    print(f"{'stage':<22} {'seconds':>9} {'pages/s':>10} {'MB/s':>8} {'peak MB':>9}")
+    for name, elapsed, peak in results:
+        elapsed = max(elapsed, 1e-9)
+        print(
+            f"{name:<22} {elapsed:>9.3f} {pages / elapsed:>10.0f} "
+            f"{megabytes / elapsed:>8.2f} {peak / 1e6:>9.2f}"
+        )
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark each build stage on a synthetic corpus.")
+    add_corpus_arguments(parser)
+    parser.add_argument("--keep", metavar="DIR", help="generate into DIR and keep it")
+    args = parser.parse_args(argv)
+
+    root = args.keep or tempfile.mkdtemp(prefix="htmlboot-bench-")
+    try:
+        generate_corpus(root, spec_from_args(args))
+        results, megabytes = run(root, args.pages)
+        report(results, args.pages, megabytes)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
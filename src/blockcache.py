@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+from output import AtomicFile
+
+# Rendered blocks from earlier builds, kept in the project root rather than
+# docs/ so the cache is never deployed with the site
+BLOCK_CACHE_NAME = ".block-cache.json"
+BLOCK_CACHE_BYTES = 32 * 1024 * 1024
+# Bump whenever a change to the markdown renderer changes the HTML of a
+# block, so fragments rendered by older code are never reused
+RENDER_VERSION = 1
+
+
+def block_key(block, basepath, variant=""):
+    # variant covers whatever else the block's HTML depends on, such as the
+    # sizes of its images when they are filled in (ImageIndex.variant)
+    text = f"{RENDER_VERSION}\0{basepath}\0{variant}\0{block.text}"
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+class BlockCache:
+    # key -> [html, {term: count}, build]: the rendered HTML of a block, its
+    # words for the search index and the last build that used it. Workers
+    # fill their own copy and hand back what they learned through drain().
+    def __init__(self, entries=None, build=0, path=None, max_bytes=BLOCK_CACHE_BYTES):
+        self.entries = {} if entries is None else entries
+        self.build = build
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._fresh = {}
+        self._used = set()
+
+    @classmethod
+    def load(cls, cache_dir, max_bytes=BLOCK_CACHE_BYTES):
+        path = os.path.join(cache_dir, BLOCK_CACHE_NAME)
+        data = None
+        if max_bytes > 0:
+            try:
+                with open(path, "r") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                pass
+        if not isinstance(data, dict) or data.get("version") != RENDER_VERSION:
+            data = {"build": 0, "entries": {}}
+        return cls(data["entries"], data["build"] + 1, path if max_bytes > 0 else None, max_bytes)
+
+    def start_build(self):
+        # For a cache kept in memory from one build to the next (the build
+        # daemon) instead of being loaded anew for each
+        self.build += 1
+        self.drain()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[2] = self.build
+        self._used.add(key)
+        return entry
+
+    def put(self, key, html, terms):
+        entry = [html, terms, self.build]
+        self.entries[key] = entry
+        self._fresh[key] = entry
+        return entry
+
+    def drain(self):
+        # What this cache learned since the last drain, for absorb()
+        drained = (self._fresh, self._used, self.hits, self.misses)
+        self._fresh, self._used = {}, set()
+        self.hits = self.misses = 0
+        return drained
+
+    def absorb(self, drained):
+        fresh, used, hits, misses = drained
+        self.entries.update(fresh)
+        for key in used:
+            if key in self.entries:
+                self.entries[key][2] = self.build
+        self.hits += hits
+        self.misses += misses
+
+    def trim(self):
+        # Keeps the most recently used blocks that fit in max_bytes
+        kept = {}
+        size = 0
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1][2], reverse=True):
+            size += len(entry[0]) + 16 * len(entry[1]) + 64
+            if size > self.max_bytes:
+                break
+            kept[key] = entry
+        self.entries = kept
+
+    def save(self):
+        if self.path is None:
+            return
+        self.trim()
+        data = {"version": RENDER_VERSION, "build": self.build, "entries": self.entries}
+        # One write of the whole document; json.dump would issue one per token
+        text = json.dumps(data, separators=(",", ":"))
+        with AtomicFile(self.path) as file:
+            file.write(text)
+
+    def summary(self):
+        return f"{self.hits} reused, {self.misses} rendered"
@@ -0,0 +1,134 @@
+import io
+import os
+
+from frontmatter import page_template, split_front_matter
+from images import ImageIndex, is_image, probe_image_file
+from markdown_blocks import write_page
+from output import AtomicFile
+from template import compile_template
+
+# Layout of a project, relative to whatever source it is read from
+CONTENT_DIR = "content"
+STATIC_DIR = "static"
+TEMPLATE_NAME = "template.html"
+
+
+class DictSource:
+    # Project files held in memory: {relative path: str or bytes}
+    def __init__(self, files):
+        self.files = {os.path.normpath(path): data for path, data in files.items()}
+
+    def list(self, directory):
+        prefix = os.path.normpath(directory) + os.sep
+        return sorted(path for path in self.files if path.startswith(prefix))
+
+    def read_bytes(self, path):
+        data = self._get(path)
+        return data.encode() if isinstance(data, str) else data
+
+    def read_text(self, path):
+        data = self._get(path)
+        return data.decode() if isinstance(data, bytes) else data
+
+    def _get(self, path):
+        try:
+            return self.files[os.path.normpath(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+
+class DirectorySource:
+    # A project on disk; paths are relative to root
+    def __init__(self, root):
+        self.root = root
+
+    def list(self, directory):
+        paths = []
+        for dirpath, _, files in os.walk(os.path.join(self.root, directory)):
+            paths.extend(os.path.relpath(os.path.join(dirpath, file), self.root) for file in files)
+        return sorted(paths)
+
+    def read_bytes(self, path):
+        with open(os.path.join(self.root, path), "rb") as file:
+            return file.read()
+
+    def read_text(self, path):
+        with open(os.path.join(self.root, path), "r") as file:
+            return file.read()
+
+
+class DictSink:
+    # Collects the built site as {relative path: str (pages) or bytes (static files)}
+    def __init__(self):
+        self.files = {}
+
+    def write(self, path, data):
+        self.files[path] = data
+
+
+class DirectorySink:
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, path, data):
+        dest_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        with AtomicFile(dest_path, "wb" if isinstance(data, bytes) else "w") as file:
+            file.write(data)
+
+
+class CallbackSink:
+    # Hands every output to callback(path, data) as soon as it is built
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, path, data):
+        self.callback(path, data)
+
+
+def page_output_path(md_path):
+    # content-relative markdown path -> site-relative HTML path
+    directory, file = os.path.split(md_path)
+    html_name = "index.html" if file == "index.md" else file[:-3] + ".html"
+    return os.path.join(directory, html_name)
+
+
+def build_site(source, sink, basepath="/", drafts=False, minify=False):
+    # Builds every page and static file of the project in source into sink,
+    # with no disk access beyond what they do themselves. There is no
+    # manifest here, so every page is rendered; the CLI's incremental build
+    # is main.build, and pages come out of the same write_page. Returns the
+    # pages that failed as (path, error). Drafts are left out unless drafts
+    # is set; minify is as for main.build.
+    sizes = {}
+    for path in source.list(STATIC_DIR):
+        rel_path = os.path.relpath(path, STATIC_DIR)
+        data = source.read_bytes(path)
+        sink.write(rel_path, data)
+        if is_image(path):
+            size = probe_image_file(io.BytesIO(data))
+            if size:
+                sizes[rel_path.replace(os.sep, "/")] = size
+    images = ImageIndex(sizes)
+
+    # A page's own template (see frontmatter.py) is compiled when first used
+    templates = {TEMPLATE_NAME: compile_template(TEMPLATE_NAME, read=source.read_text)}
+    failed = []
+    for path in source.list(CONTENT_DIR):
+        if not path.endswith(".md"):
+            continue
+        page = io.StringIO()
+        try:
+            markdown = source.read_text(path)
+            meta, _ = split_front_matter(markdown)
+            if meta.get("draft") and not drafts:
+                continue
+            template_path = page_template(meta, TEMPLATE_NAME)
+            if template_path not in templates:
+                templates[template_path] = compile_template(template_path, read=source.read_text)
+            write_page(markdown, templates[template_path], page, basepath, images=images, minify=minify)
+        except Exception as e:
+            failed.append((path, f"{type(e).__name__}: {e}"))
+            continue
+        sink.write(page_output_path(os.path.relpath(path, CONTENT_DIR)), page.getvalue())
+    return failed
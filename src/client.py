@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Kept to the standard library on purpose: this runs once per rebuild, so it
+# must start fast and leave the build itself to the daemon (see daemon.py)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOCKET_NAME = ".build-daemon.sock"
+COMMANDS = ("build", "build-path", "stats", "stop")
+
+
+def default_socket_path(project_root=PROJECT_ROOT):
+    return os.path.join(project_root, SOCKET_NAME)
+
+
+def send_request(socket_path, request, timeout=None):
+    # One JSON object per line each way, one request per connection
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b"\n")
+        with connection.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError("the build daemon closed the connection without replying")
+    return json.loads(line)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="client.py", description="Send a command to a running build daemon (main.py daemon).",
+    )
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("paths", nargs="*", help="changed files, for build-path")
+    parser.add_argument("--socket", default=default_socket_path(), help="the daemon's socket")
+    args = parser.parse_args(argv)
+    if args.command == "build-path" and not args.paths:
+        parser.error("build-path needs at least one path")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    request = {"command": args.command}
+    if args.paths:
+        # The daemon may run in another directory
+        request["paths"] = [os.path.abspath(path) for path in args.paths]
+    try:
+        reply = send_request(args.socket, request)
+    except OSError as e:
+        print(f"No build daemon at {args.socket}: {e}", file=sys.stderr)
+        return 2
+    if reply.get("output"):
+        print(reply["output"], end="")
+    if "stats" in reply:
+        print(json.dumps(reply["stats"], indent=1, sort_keys=True))
+    if not reply.get("ok"):
+        print(f"Error: {reply.get('error')}", file=sys.stderr)
+        return 1
+    # The build output already lists the failed pages
+    return 1 if reply.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
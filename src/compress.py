@@ -0,0 +1,170 @@
+import gzip
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from manifest import HashCache, hash_bytes, hash_file, load_manifest, save_manifest
+from output import AtomicFile, ChangeSet
+
+# Outputs worth precompressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml"}
+# Below this the gzip header and the extra request bookkeeping outweigh the saving
+MIN_SIZE = 1024
+
+
+def compress_outputs(public_dir, changes=None, workers=None, manifest=None, changed_only=False):
+    # Writes a .gz sidecar next to every compressible output in public_dir.
+    # Outputs the build recorded in changes are recompressed; any other one
+    # is only hashed again if its stat stamp moved since the last run. With
+    # changed_only, the outputs changes lists are the only ones looked at,
+    # for a rebuild that knows exactly what it wrote. A manifest passed in is
+    # updated in place and left to the caller to save.
+    # zlib releases the GIL while it compresses, so threads are enough to use
+    # every core without pickling file contents to worker processes.
+    changes = ChangeSet() if changes is None else changes
+    written = changes.added | changes.changed
+    save = manifest is None
+    if save:
+        manifest = load_manifest(public_dir)
+    previous = manifest.get("gzip", {})
+    pending = []
+    counts = {"written": 0, "reused": 0, "skipped": 0, "removed": 0}
+
+    if changed_only:
+        # Every other output keeps its entry (and sidecar) as it is
+        touched = {os.path.relpath(path, public_dir) for path in written | changes.removed}
+        entries = {rel_path: entry for rel_path, entry in previous.items() if rel_path not in touched}
+        files = [(path, _compressible(path, public_dir)) for path in sorted(written)]
+        files = [(path, stat) for path, stat in files if stat is not None]
+    else:
+        entries = {}
+        files = _compressible_files(public_dir)
+
+    for path, stat in files:
+        rel_path = os.path.relpath(path, public_dir)
+        entry = previous.get(rel_path)
+        if path in written or entry is None or (entry["gzip"] and not os.path.exists(path + ".gz")):
+            pending.append((path, rel_path))
+            continue
+        stamp = _stamp(stat)
+        if stamp is None or entry.get("stamp") != stamp:
+            # Touched outside the build; the content says whether it changed
+            if hash_file(path) != entry["hash"]:
+                pending.append((path, rel_path))
+                continue
+            entry = dict(entry, stamp=stamp)
+        entries[rel_path] = entry
+        counts["reused" if entry["gzip"] else "skipped"] += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_write_sidecar, [path for path, _ in pending])
+        for (path, rel_path), (status, source_hash, stamp) in zip(pending, results):
+            entries[rel_path] = {"hash": source_hash, "gzip": status is not None, "stamp": stamp}
+            if status is None:
+                counts["skipped"] += 1
+                if _remove(path + ".gz"):
+                    changes.record_removed(path + ".gz")
+                continue
+            changes.record(path + ".gz", status)
+            counts["written"] += 1
+
+    # Sidecars of outputs that are gone (or no longer compressed) go too
+    for rel_path, entry in previous.items():
+        if rel_path in entries or not entry["gzip"]:
+            continue
+        gz_path = os.path.join(public_dir, rel_path + ".gz")
+        if _remove(gz_path):
+            changes.record_removed(gz_path)
+            counts["removed"] += 1
+
+    manifest["gzip"] = entries
+    if save:
+        save_manifest(public_dir, manifest)
+    print("Gzip: " + ", ".join(f"{n} {name}" for name, n in counts.items()))
+    return counts
+
+
+def drop_stale_sidecars(public_dir, changes, manifest=None):
+    # For a build without compression: removes the .gz sidecars of the
+    # outputs changes lists as written or removed, which no longer match
+    # them, and forgets them in the manifest so a later compressing build
+    # writes them again. Sidecars of untouched outputs are kept. A manifest
+    # passed in is left to the caller to save. Returns how many went.
+    save = manifest is None
+    if save:
+        manifest = load_manifest(public_dir)
+    entries = manifest.get("gzip", {})
+    removed = 0
+    for path in sorted(changes.added | changes.changed | changes.removed):
+        entries.pop(os.path.relpath(path, public_dir), None)
+        if not path.endswith(".gz") and _remove(path + ".gz"):
+            changes.record_removed(path + ".gz")
+            removed += 1
+    if save:
+        save_manifest(public_dir, manifest)
+    if removed:
+        print(f"Gzip: {removed} stale sidecar(s) removed")
+    return removed
+
+
+def _compressible_files(public_dir):
+    # Yields (path, stat) for every output worth a sidecar
+    for root, dirs, files in os.walk(public_dir):
+        # Dot-directories and dotfiles (manifest, change list) are build metadata
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for file in files:
+            if file.startswith("."):
+                continue
+            if os.path.splitext(file)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, file)
+            stat = os.stat(path)
+            if stat.st_size >= MIN_SIZE:
+                yield path, stat
+
+
+def _compressible(path, public_dir):
+    # The stat of path if _compressible_files would yield it, else None
+    rel_path = os.path.relpath(path, public_dir)
+    if any(part.startswith(".") for part in rel_path.split(os.sep)):
+        return None
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat if stat.st_size >= MIN_SIZE else None
+
+
+def _stamp(stat):
+    # [mtime_ns, size], or None while the mtime is too recent to rule out a
+    # same-size rewrite within the same tick (see HashCache)
+    if time.time() - stat.st_mtime <= HashCache.RACY_SECONDS:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _write_sidecar(path):
+    # Returns (AtomicFile status or None when gzip doesn't make it smaller,
+    # content hash, stamp) for the bytes that were compressed
+    with open(path, "rb") as file:
+        stamp = _stamp(os.fstat(file.fileno()))
+        data = file.read()
+    source_hash = hash_bytes(data)
+    # mtime=0 keeps the bytes stable, so unchanged inputs give unchanged sidecars
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) >= len(data):
+        return None, source_hash, stamp
+    output = AtomicFile(path + ".gz", "wb")
+    with output as file:
+        file.write(compressed)
+    return output.status, source_hash, stamp
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
@@ -0,0 +1,171 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+
+# Builds a synthetic site (content/, static/, template.html) for benchmarks.
+# The same arguments and seed always produce the same bytes.
+
+WORDS = (
+    "the ring hobbit elf shire wizard mountain river forest road tower king "
+    "song shadow light ancient council journey battle sword star valley "
+    "dwarf gate stone fire water wind path quest friend bridge city"
+).split()
+
+DEFAULT_TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <meta charset="utf-8" />
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+
+class CorpusSpec:
+    def __init__(
+        self,
+        pages=100,
+        page_size=4096,
+        link_density=0.05,
+        list_share=0.15,
+        quote_share=0.1,
+        code_share=0.1,
+        pages_per_section=100,
+        seed=0,
+    ):
+        self.pages = pages
+        # approximate markdown bytes per page
+        self.page_size = page_size
+        # fraction of words that become a link
+        self.link_density = link_density
+        # fraction of blocks that are lists, quotes and code blocks; the rest
+        # are paragraphs (plus one heading every few blocks)
+        self.list_share = list_share
+        self.quote_share = quote_share
+        self.code_share = code_share
+        self.pages_per_section = pages_per_section
+        self.seed = seed
+
+
+def generate_corpus(root, spec):
+    # Writes the site under root and returns the total markdown bytes
+    rng = random.Random(spec.seed)
+    content_dir = os.path.join(root, "content")
+    static_dir = os.path.join(root, "static")
+    os.makedirs(static_dir, exist_ok=True)
+    with open(os.path.join(static_dir, "index.css"), "w") as file:
+        file.write("body { font-family: serif; }\n")
+    with open(os.path.join(root, "template.html"), "w") as file:
+        file.write(DEFAULT_TEMPLATE)
+
+    total = 0
+    for number in range(spec.pages):
+        section = f"section-{number // spec.pages_per_section:03d}"
+        page_dir = os.path.join(content_dir, section, f"page-{number:05d}")
+        os.makedirs(page_dir, exist_ok=True)
+        markdown = make_page(rng, spec, number)
+        with open(os.path.join(page_dir, "index.md"), "w") as file:
+            file.write(markdown)
+        total += len(markdown.encode())
+    return total
+
+
+def make_page(rng, spec, number):
+    blocks = [f"# Page {number}"]
+    size = len(blocks[0])
+    while size < spec.page_size:
+        if len(blocks) % 6 == 0:
+            block = f"## {make_sentence(rng, spec, 3, False)}"
+        else:
+            roll = rng.random()
+            if roll < spec.list_share:
+                block = make_list(rng, spec)
+            elif roll < spec.list_share + spec.quote_share:
+                block = "\n".join(f"> {make_sentence(rng, spec, 12)}" for _ in range(rng.randint(1, 3)))
+            elif roll < spec.list_share + spec.quote_share + spec.code_share:
+                block = make_code(rng)
+            else:
+                block = "\n".join(make_sentence(rng, spec, 16) for _ in range(rng.randint(1, 4)))
+        blocks.append(block)
+        size += len(block) + 2
+    return "\n\n".join(blocks) + "\n"
+
+
+def make_sentence(rng, spec, words, markup=True):
+    parts = []
+    for _ in range(rng.randint(words // 2, words)):
+        word = rng.choice(WORDS)
+        roll = rng.random() if markup else 1.0
+        if roll < spec.link_density:
+            word = f"[{word}](/section-{rng.randint(0, 9):03d}/page-{rng.randint(0, 99999):05d})"
+        elif roll < spec.link_density + 0.03:
+            word = f"**{word}**"
+        elif roll < spec.link_density + 0.06:
+            word = f"_{word}_"
+        elif roll < spec.link_density + 0.08:
+            word = f"`{word}`"
+        elif roll < spec.link_density + 0.085:
+            word = f"![{word}](/images/{word}.png)"
+        parts.append(word)
+    return " ".join(parts).capitalize()
+
+
+def make_list(rng, spec):
+    items = [make_sentence(rng, spec, 8) for _ in range(rng.randint(2, 6))]
+    if rng.random() < 0.5:
+        return "\n".join(f"- {item}" for item in items)
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+
+
+def make_code(rng):
+    lines = [f"    let {rng.choice(WORDS)} = {rng.randint(0, 999)};" for _ in range(rng.randint(2, 10))]
+    return "```\nfn main() {\n" + "\n".join(lines) + "\n}\n```"
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=4096, help="approximate bytes per page")
+    parser.add_argument("--link-density", type=float, default=0.05)
+    parser.add_argument("--list-share", type=float, default=0.15)
+    parser.add_argument("--quote-share", type=float, default=0.1)
+    parser.add_argument("--code-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic site.")
+    parser.add_argument("root", help="directory to write content/, static/ and template.html into")
+    add_corpus_arguments(parser)
+    parser.add_argument("--clean", action="store_true", help="delete root first")
+    return parser.parse_args(argv)
+
+
+def spec_from_args(args):
+    return CorpusSpec(
+        pages=args.pages,
+        page_size=args.page_size,
+        link_density=args.link_density,
+        list_share=args.list_share,
+        quote_share=args.quote_share,
+        code_share=args.code_share,
+        seed=args.seed,
+    )
+
+
+def main(argv):
+    args = parse_args(argv)
+    if args.clean and os.path.exists(args.root):
+        shutil.rmtree(args.root)
+    total = generate_corpus(args.root, spec_from_args(args))
+    print(f"Wrote {args.pages} pages ({total / 1e6:.2f} MB of markdown) to {args.root}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
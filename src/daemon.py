@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import socketserver
+import time
+from collections import Counter
+
+from blockcache import BlockCache
+from client import default_socket_path, send_request
+from main import PROJECT_ROOT, BuildState, build, rebuild_paths
+from manifest import HashCache
+
+
+class BuildDaemon:
+    # Builds a project on request, keeping between builds what a fresh
+    # process would have to load again: the compiled template (load_template
+    # caches it per process), the rendered blocks, the content hashes of
+    # files that didn't change and the BuildState (manifest, search and image
+    # indexes). The block cache is only written out on close. jobs only
+    # applies to the first build: its workers start from the block cache on
+    # disk, which is what the daemon loaded too. Later requests render
+    # in-process against the warm cache in memory, rather than starting a
+    # pool whose workers would each load the (by then stale) file again.
+    def __init__(self, project_root, basepath="/", jobs=1, gzip=True, minify=False):
+        self.project_root = project_root
+        self.basepath = basepath
+        self.jobs = jobs
+        self.warm = False
+        self.gzip = gzip
+        self.minify = minify
+        self.blocks = BlockCache.load(project_root)
+        self.hashes = HashCache()
+        self.state = None
+        self.started = time.time()
+        self.counts = Counter()
+        self.last_ms = None
+        self.stopped = False
+
+    def handle(self, request):
+        # request is a decoded {"command": ...}; returns the reply to send back
+        command = request.get("command")
+        if command == "stats":
+            return {"ok": True, "stats": self.stats()}
+        if command == "stop":
+            self.stopped = True
+            return {"ok": True, "output": "Build daemon stopping.\n"}
+        if command == "build":
+            run = self.build
+        elif command == "build-path":
+            paths = request.get("paths")
+            if not isinstance(paths, list) or not paths:
+                return {"ok": False, "error": "build-path needs a list of paths"}
+            run = functools.partial(self.build_paths, paths)
+        else:
+            return {"ok": False, "error": f"unknown command: {command!r}"}
+
+        # The build reports on stdout; hand that back to the client instead
+        output = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                failed = run()
+        except Exception as e:
+            # It may have been left half updated; start over from disk
+            self.state = None
+            return {"ok": False, "error": f"{type(e).__name__}: {e}", "output": output.getvalue()}
+        finally:
+            # What was rendered for this build stays, up to the cache's size
+            self.blocks.trim()
+        self.last_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.counts[command] += 1
+        return {"ok": True, "output": output.getvalue(), "failed": failed, "ms": self.last_ms}
+
+    def build(self):
+        self.blocks.start_build()
+        failed = build(
+            self.project_root, self.basepath, 1 if self.warm else self.jobs, self.gzip, minify=self.minify,
+            blocks=self.blocks, hashes=self.hashes, state=self.current_state(),
+        )
+        self.warm = True
+        return failed
+
+    def build_paths(self, paths):
+        self.blocks.start_build()
+        return rebuild_paths(
+            self.project_root, self.basepath, [os.path.abspath(path) for path in paths], self.gzip,
+            self.blocks, self.hashes, self.minify, self.current_state(),
+        )
+
+    def current_state(self):
+        # Loaded again only if something else built into docs/ meanwhile
+        if self.state is None or not self.state.is_current():
+            self.state = BuildState(os.path.join(self.project_root, "docs"))
+        return self.state
+
+    def stats(self):
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": dict(self.counts),
+            "last_build_ms": self.last_ms,
+            "blocks": len(self.blocks.entries),
+            "last_build_blocks": self.blocks.summary(),
+            "hashed_files": len(self.hashes.entries),
+        }
+
+    def close(self):
+        self.blocks.save()
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            request = None
+        if isinstance(request, dict):
+            reply = self.server.build_daemon.handle(request)
+        else:
+            reply = {"ok": False, "error": "expected one JSON object per line"}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="main.py daemon",
+        description="Keep a build process running and rebuild on commands sent by client.py.",
+    )
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="render the first build's pages in N worker processes; later ones reuse the warm cache in-process",
+    )
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="don't write .gz sidecars")
+    parser.add_argument("--minify", action="store_true", help="strip comments and layout whitespace from pages")
+    parser.add_argument("--socket", help="Unix socket to listen on (default: .build-daemon.sock in the project)")
+    return parser.parse_args(argv)
+
+
+def serve_daemon(argv, project_root=PROJECT_ROOT):
+    args = parse_args(argv)
+    socket_path = args.socket or default_socket_path(project_root)
+    if not _claim_socket(socket_path):
+        print(f"A build daemon is already listening on {socket_path}")
+        return 1
+
+    build_daemon = BuildDaemon(project_root, args.basepath, args.jobs, args.gzip, args.minify)
+    # The first build warms every cache before any client waits on one
+    print(build_daemon.handle({"command": "build"})["output"], end="")
+    # Anyone who can connect can make it write to docs/, so the socket is
+    # created owner-only rather than narrowed after it is already listening
+    umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, DaemonRequestHandler)
+    finally:
+        os.umask(umask)
+    server.build_daemon = build_daemon
+    print(f"Build daemon listening on {socket_path}")
+    try:
+        # One request at a time, so builds never overlap
+        while not build_daemon.stopped:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(socket_path)
+        build_daemon.close()
+    return 0
+
+
+def _claim_socket(socket_path):
+    # A socket file left behind by a daemon that died is removed; one that
+    # still answers belongs to a running daemon
+    if not os.path.exists(socket_path):
+        return True
+    try:
+        send_request(socket_path, {"command": "stats"}, timeout=1)
+    except OSError:
+        os.remove(socket_path)
+        return True
+    return False
@@ -0,0 +1,113 @@
+import io
+import os
+
+# An optional header at the very top of a markdown file:
+#
+#   ---
+#   title: Why Tom Bombadil Was a Mistake
+#   date: 2024-05-01
+#   tags: [tolkien, opinion]
+#   draft: true
+#   template: post.html
+#   ---
+#
+# Only flat "key: value" lines are understood (plus "- item" lines under a
+# key with no value), not YAML in general. Values are strings, except tags
+# (a list) and draft (a bool).
+FENCE = "---"
+# Longer than this without a closing fence and it isn't front matter; keeps
+# the metadata-only read down to the first few hundred bytes of a page
+MAX_LINES = 64
+TRUE_VALUES = ("true", "yes", "on", "1")
+
+
+def read_header(file):
+    # Reads the front matter at file's current position and returns it as a
+    # dict, leaving file just past it. Without front matter (or with one that
+    # doesn't parse) it returns {} and leaves file where it was.
+    start = file.tell()
+    if file.readline().rstrip("\r\n") != FENCE:
+        file.seek(start)
+        return {}
+    meta = {}
+    key = None
+    for _ in range(MAX_LINES):
+        line = file.readline()
+        if not line:
+            break
+        line = line.rstrip("\r\n")
+        if line.rstrip() == FENCE:
+            return meta
+        key = _parse_line(line, meta, key)
+        if key is False:
+            break
+    file.seek(start)
+    return {}
+
+
+def _parse_line(line, meta, key):
+    # Adds the line to meta; returns the key later "- item" lines belong to,
+    # or False if the line isn't front matter
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#"):
+        return key
+    if stripped.startswith("- ") and key is not None:
+        if meta[key] == "":
+            meta[key] = []
+        if isinstance(meta[key], list):
+            meta[key].append(_unquote(stripped[2:].strip()))
+            return key
+    name, sep, value = line.partition(":")
+    name = name.strip().lower()
+    if not sep or not name.isidentifier():
+        return False
+    value = value.strip()
+    if name == "tags":
+        meta[name] = [_unquote(tag.strip()) for tag in value.strip("[]").split(",") if tag.strip()]
+    elif name == "draft":
+        meta[name] = value.lower() in TRUE_VALUES
+    else:
+        meta[name] = _unquote(value)
+    return name
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def split_front_matter(markdown):
+    # (meta, body) for a whole document
+    if not markdown.startswith(FENCE):
+        return {}, markdown
+    file = io.StringIO(markdown)
+    meta = read_header(file)
+    return meta, markdown[file.tell():]
+
+
+def read_front_matter(path):
+    # Only the header is read, never the body
+    with open(path, "r") as file:
+        return read_header(file)
+
+
+def page_template(meta, template_path):
+    # A page's own template is looked up next to the site's template.html
+    name = meta.get("template")
+    if not name:
+        return template_path
+    return os.path.join(os.path.dirname(template_path), name)
+
+
+def list_pages(content_dir, drafts=False):
+    # Yields (content-relative path, meta) for every markdown file, reading
+    # only front matter: enough for page listings, tag indexes and the like
+    for root, _, files in os.walk(content_dir):
+        for file in sorted(files):
+            if not file.endswith(".md"):
+                continue
+            path = os.path.join(root, file)
+            meta = read_front_matter(path)
+            if drafts or not meta.get("draft"):
+                yield os.path.relpath(path, content_dir), meta
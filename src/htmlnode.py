@@ -1,11 +1,20 @@
+from types import MappingProxyType
+
+# Read-only stand-ins shared by every node without props or children, instead
+# of a fresh empty dict and list per node
+EMPTY_PROPS = MappingProxyType({})
+NO_CHILDREN = ()
 
 
 class HTMLNode:
+    # Pages are made of many small nodes; slots keep each one free of a __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag #representative of HTML tag names
         self.value = value #string value of the HTML tag
-        self.children = children if children is not None else [] # a list of HTMLNode objects
-        self.props = props if props is not None else {} # dictionary - attribute of the tag
+        self.children = children if children is not None else NO_CHILDREN # a list of HTMLNode objects
+        self.props = props if props is not None else EMPTY_PROPS # mapping - attribute of the tag
 
     def to_html(self):
         raise NotImplementedError
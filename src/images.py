@@ -0,0 +1,163 @@
+import json
+import os
+import struct
+from urllib.parse import unquote
+
+from inline_markdown import extract_markdown_images
+from manifest import hash_bytes, load_manifest
+from output import AtomicFile
+from textnode import with_basepath
+
+# Dimensions of every image seen so far by content hash, next to the build manifest
+IMAGE_INDEX_NAME = ".image-index.json"
+IMAGE_EXTENSIONS = (".png", ".gif", ".jpg", ".jpeg")
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers, which carry the dimensions; C4, C8 and CC sit
+# in the same range but are tables and extensions, not frames
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def is_image(path):
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def probe_image(path):
+    # (width, height) from the file's header, or None if it isn't a PNG,
+    # GIF or JPEG we can read; only the header is read, never the pixels
+    try:
+        with open(path, "rb") as file:
+            return probe_image_file(file)
+    except OSError:
+        return None
+
+
+def probe_image_file(file):
+    # probe_image for a binary file object at its start, such as an
+    # io.BytesIO of an image held in memory
+    try:
+        head = file.read(24)
+        if head.startswith(PNG_SIGNATURE) and head[12:16] == b"IHDR":
+            size = struct.unpack(">II", head[16:24])
+        elif head[:6] in (b"GIF87a", b"GIF89a"):
+            size = struct.unpack("<HH", head[6:10])
+        elif head.startswith(b"\xff\xd8"):
+            size = _jpeg_size(file)
+        else:
+            size = None
+    except (OSError, struct.error):
+        return None
+    if not size or not all(size):
+        return None
+    return size
+
+
+def _jpeg_size(file):
+    # Walks the marker segments up to the first frame header, seeking past
+    # the others (EXIF thumbnails and the like can be large)
+    file.seek(2)
+    while True:
+        if file.read(1) != b"\xff":
+            return None
+        marker = file.read(1)
+        while marker == b"\xff":
+            marker = file.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Markers without a length
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan before any frame header
+            return None
+        (length,) = struct.unpack(">H", file.read(2))
+        if marker in SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", file.read(5))
+            return width, height
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+class ImageIndex:
+    # Site path ("images/a.png") -> (width, height) for each static image
+    # copied into the output. digest changes whenever any of them does; pages
+    # and blocks are keyed on sizes_in() instead, so only what shows an image
+    # is rendered again when it changes.
+    def __init__(self, sizes=None):
+        self.sizes = {} if sizes is None else sizes
+        self.digest = hash_bytes(json.dumps(sorted(self.sizes.items())).encode())[:16]
+
+    @classmethod
+    def load(cls, public_dir, static=None):
+        # Uses the content hashes the static sync recorded in the manifest
+        # (static is that section, if the caller already has it); only bytes
+        # not in IMAGE_INDEX_NAME yet are probed
+        if static is None:
+            static = load_manifest(public_dir).get("static", {})
+        path = os.path.join(public_dir, IMAGE_INDEX_NAME)
+        try:
+            with open(path, "r") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            cached = None
+        if not isinstance(cached, dict):
+            cached = {}
+
+        known = {}
+        sizes = {}
+        for rel_path, entry in static.items():
+            digest = entry.get("hash")
+            if digest is None:
+                continue
+            if digest not in known:
+                if digest in cached:
+                    known[digest] = cached[digest]
+                else:
+                    size = probe_image(os.path.join(public_dir, rel_path))
+                    known[digest] = list(size) if size else None
+            if known[digest]:
+                sizes[rel_path.replace(os.sep, "/")] = tuple(known[digest])
+        if known != cached:
+            # Also forgets images that are no longer in the site
+            with AtomicFile(path) as file:
+                json.dump(known, file, indent=1, sort_keys=True)
+        return cls(sizes)
+
+    def lookup(self, src, basepath="/"):
+        # src as it appears in the page, basepath included
+        if not src.startswith(basepath):
+            return None
+        path = src[len(basepath):].split("#", 1)[0].split("?", 1)[0]
+        return self.sizes.get(unquote(path))
+
+    def sizes_in(self, markdown, basepath="/"):
+        # {url: [width, height] or None} for the images markdown shows, which
+        # is all its img tags depend on
+        if "![" not in markdown:
+            return {}
+        return {url: self._size_of(url, basepath) for _, url in extract_markdown_images(markdown)}
+
+    def variant(self, markdown, basepath="/"):
+        # sizes_in() as a block_key variant; "" for text without images
+        sizes = self.sizes_in(markdown, basepath)
+        return json.dumps(sizes, sort_keys=True) if sizes else ""
+
+    def unchanged(self, sizes, basepath="/"):
+        # Whether sizes (from sizes_in() on an earlier build) still hold
+        return all(self._size_of(url, basepath) == size for url, size in sizes.items())
+
+    def _size_of(self, url, basepath):
+        size = self.lookup(with_basepath(url, basepath), basepath)
+        return list(size) if size else None
+
+    def annotate(self, node, basepath="/"):
+        # Gives every img under node loading="lazy", and its width and height
+        # when it is one of ours, so the page doesn't shift as images load
+        if node.tag == "img":
+            props = dict(node.props)
+            size = self.lookup(props.get("src", ""), basepath)
+            if size:
+                props["width"], props["height"] = str(size[0]), str(size[1])
+            props["loading"] = "lazy"
+            node.props = props
+        for child in node.children:
+            self.annotate(child, basepath)
@@ -3,16 +3,69 @@ import re
 from textnode import TextNode, TextType
 
 
+# Delimiters in the order they take precedence: text inside **bold** is never
+# searched for _italic_, and so on down to images and links.
+DELIMITERS = (
+    ("**", TextType.BOLD),
+    ("_", TextType.ITALIC),
+    ("`", TextType.CODE),
+)
+
+# Images and links in a single pattern; group 1 is "!" for an image
+IMAGE_OR_LINK_PATTERN = re.compile(r"(!?)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+
+
 def text_to_textnodes(text):
-    nodes = [TextNode(text, TextType.TEXT)]
-    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
+    # Produces the same nodes as running split_nodes_delimiter for each
+    # delimiter and then split_nodes_image and split_nodes_link. Each
+    # delimiter level splits only the plain sections the level above left,
+    # and images and links come from one finditer, so the work is linear in
+    # the text: nothing is re-split per match and the nodes are appended to
+    # one list instead of rebuilding it per pass
+    if not text:
+        return []
+    if "**" not in text and "_" not in text and "`" not in text and "[" not in text:
+        return [TextNode(text, TextType.TEXT)]
+    nodes = []
+    _lex_delimited(text, 0, nodes)
     return nodes
 
 
+def _lex_delimited(text, level, nodes):
+    if level == len(DELIMITERS):
+        _lex_images_and_links(text, nodes)
+        return
+    delimiter, text_type = DELIMITERS[level]
+    if delimiter not in text:
+        _lex_delimited(text, level + 1, nodes)
+        return
+    sections = text.split(delimiter)
+    if len(sections) % 2 == 0:
+        raise ValueError("invalid markdown, formatted section not closed")
+    for i, section in enumerate(sections):
+        if section == "":
+            continue
+        if i % 2 == 0:
+            _lex_delimited(section, level + 1, nodes)
+        else:
+            nodes.append(TextNode(section, text_type))
+
+
+def _lex_images_and_links(text, nodes):
+    if "[" not in text:
+        nodes.append(TextNode(text, TextType.TEXT))
+        return
+    position = 0
+    for match in IMAGE_OR_LINK_PATTERN.finditer(text):
+        if match.start() > position:
+            nodes.append(TextNode(text[position:match.start()], TextType.TEXT))
+        bang, label, url = match.groups()
+        nodes.append(TextNode(label, TextType.IMAGE if bang else TextType.LINK, url))
+        position = match.end()
+    if position < len(text):
+        nodes.append(TextNode(text[position:], TextType.TEXT))
+
+
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     new_nodes = []
     for old_node in old_nodes:
@@ -1,6 +1,8 @@
 from htmlnode import HTMLNode # import parent class
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
         # call parent constructor and set children to None (a quality of a leaf)
         super().__init__(tag, value, None, props)
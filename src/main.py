@@ -1,67 +1,378 @@
+import argparse
 import os
 import shutil
 import sys
+from collections import Counter
 
-from markdown_blocks import generate_pages_recursive
+from blockcache import BLOCK_CACHE_BYTES, BlockCache
+from builder import page_output_path
+from compress import compress_outputs, drop_stale_sidecars
+from frontmatter import page_template, read_front_matter, read_header
+from images import ImageIndex, is_image
+from manifest import (
+    MANIFEST_NAME,
+    hash_file,
+    inputs_match,
+    load_manifest,
+    new_manifest,
+    page_is_current,
+    save_manifest,
+)
+from markdown_blocks import parse_blocks
+from output import UNCHANGED, ChangeSet, copy_atomic, link_atomic
+from parallel import render_pages
+import profiler
+from search import SearchIndex
+from template import load_template
 
-def main():
-    
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site into docs/.")
     #default basepath is '/' if no argument is provided
-    basepath = "/"
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="render pages in N worker processes (0 = one per CPU core)",
+    )
+    parser.add_argument("--no-gzip", dest="gzip", action="store_false", help="don't write .gz sidecars")
+    parser.add_argument("--minify", action="store_true", help="strip comments and layout whitespace from pages")
+    parser.add_argument("--drafts", action="store_true", help="also build pages marked draft: true")
+    parser.add_argument(
+        "--block-cache-mb", type=float, default=BLOCK_CACHE_BYTES / (1024 * 1024), metavar="MB",
+        help="rendered blocks kept between builds (0 = only within this build)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="report time, calls and memory peaks per stage and the slowest pages",
+    )
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N", help="pages to list with --profile")
+    parser.add_argument("--profile-dump", metavar="FILE", help="also write cProfile stats to FILE")
+    args = parser.parse_args(argv)
+    if args.profile_dump:
+        args.profile = True
+    if args.jobs < 0:
+        parser.error("--jobs must be 0 or a positive number")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    return args
+
+# Get the directory of the current script
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPT_DIR)
 
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        # Development server; imported lazily so plain builds don't pay for it
+        from server import serve
+        return serve(argv[1:])
+    if argv and argv[0] == "daemon":
+        # Long-running builder for client.py; likewise imported lazily
+        from daemon import serve_daemon
+        return serve_daemon(argv[1:])
 
-    # Delete "docs" directory if it exists, then recreate it
+    args = parse_args(argv)
+    if args.profile:
+        failed = profile_build(PROJECT_ROOT, args)
+    else:
+        failed = build(
+            PROJECT_ROOT, args.basepath, args.jobs, args.gzip, _megabytes(args.block_cache_mb), args.minify,
+            drafts=args.drafts,
+        )
+    if failed:
+        sys.exit(1)
+
+def build(
+    project_root, basepath="/", jobs=1, gzip=True, block_cache_bytes=BLOCK_CACHE_BYTES, minify=False,
+    blocks=None, hashes=None, drafts=False, state=None,
+):
+    # Keep "docs" between builds so unchanged pages don't need to be regenerated.
+    # A long-running caller can pass the BlockCache, HashCache and BuildState
+    # it keeps between builds (see process_markdown_files).
     public_dir = os.path.join(project_root, "docs")
-    if os.path.exists(public_dir):
-        shutil.rmtree(public_dir)
-    os.makedirs(public_dir)
+    os.makedirs(public_dir, exist_ok=True)
+    state = BuildState(public_dir) if state is None else state
 
     # Copy static files from "static" to "docs"
     source_dir = os.path.join(project_root, "static")
     dest_dir = public_dir
-    copy_static_files(source_dir, dest_dir)
+    changes = ChangeSet()
+    with profiler.stage("static sync"):
+        # Files whose source is gone stay until the new pages are in place
+        copy_static_files(source_dir, dest_dir, changes, prune=False, state=state)
 
     # Process all markdown files in the content directory
     content_dir = os.path.join(project_root, "content")
     template_path = os.path.join(project_root, "template.html")
     
     # Process all markdown files
-    process_markdown_files(content_dir, public_dir, template_path, basepath)
+    failed = process_markdown_files(
+        content_dir, public_dir, template_path, basepath, jobs, changes, block_cache_bytes, minify,
+        blocks, hashes, drafts, cache_dir=project_root, state=state,
+    )
+    with profiler.stage("prune"):
+        prune_orphans(public_dir, changes, state)
 
-def copy_static_files(source_dir, dest_dir):
-    # First, check if destination exists and remove it
-    if os.path.exists(dest_dir):
-        shutil.rmtree(dest_dir)
-    
-    # Then create the destination directory fresh
-    os.mkdir(dest_dir)
-    
-    _copy_recursive(source_dir, dest_dir)
+    # Precompressed sidecars for servers that can send them as-is
+    if gzip:
+        with profiler.stage("gzip"):
+            compress_outputs(public_dir, changes, manifest=state.manifest)
+    else:
+        # Sidecars left from a compressing build would no longer match
+        drop_stale_sidecars(public_dir, changes, state.manifest)
+    state.save()
+
+    # List what this build added, changed and removed for upload/CDN purges
+    changes.save(public_dir)
+    print(f"Changes: {changes.summary()}")
+    return failed
+
+class BuildState:
+    # The manifest, search index and image index of a public_dir, shared by
+    # the steps of a build instead of each step loading them from disk and
+    # saving them back. A step called without one loads its own and saves
+    # it when done. The build daemon and the watcher keep theirs from one
+    # build to the next, so a rebuild only reads and writes what it changes.
+    def __init__(self, public_dir):
+        self.public_dir = public_dir
+        self.manifest = load_manifest(public_dir)
+        self._search = None
+        self._images = None
+        self._stamp = self._manifest_stamp()
+
+    def search(self):
+        if self._search is None:
+            self._search = SearchIndex.load(self.public_dir)
+        return self._search
+
+    def images(self):
+        # Built again only when the static sync recorded something new
+        static = self.manifest.get("static", {})
+        if self._images is None or self._images[0] != static:
+            self._images = (static, ImageIndex.load(self.public_dir, static))
+        return self._images[1]
+
+    def save(self):
+        save_manifest(self.public_dir, self.manifest)
+        self._stamp = self._manifest_stamp()
+
+    def is_current(self):
+        # False once another process (a plain build) rewrote the manifest
+        return self._manifest_stamp() == self._stamp
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.public_dir, MANIFEST_NAME))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+def profile_build(project_root, args):
+    if args.jobs > 1:
+        # Stages in worker processes can't report back; profile the serial path
+        print("--profile renders pages in-process, ignoring --jobs.")
+    build_profiler = profiler.Profiler(args.profile_dump)
+    build_profiler.start()
+    try:
+        with profiler.stage("build"):
+            failed = build(
+                project_root, args.basepath, gzip=args.gzip,
+                block_cache_bytes=_megabytes(args.block_cache_mb), minify=args.minify, drafts=args.drafts,
+            )
+    finally:
+        build_profiler.stop()
+    print(build_profiler.report(args.profile_top))
+    return failed
 
-def _copy_recursive(source_dir, dest_dir):
+def copy_static_files(source_dir, dest_dir, changes=None, prune=True, state=None):
+    # The destination also holds generated pages and the build manifest,
+    # so sync into it instead of wiping it: only changed files are copied and
+    # only files we copied on an earlier build are ever deleted. Images with
+    # the same bytes as one already synced are hard links to it. With
+    # prune=False, files whose source is gone are only listed as orphans in
+    # the manifest, for prune_orphans to delete at the end of the build.
+    # state is a BuildState, as for process_markdown_files.
+    os.makedirs(dest_dir, exist_ok=True)
+    save_state = state is None
+    if save_state:
+        state = BuildState(dest_dir)
+    manifest = state.manifest
+    previous = manifest.get("static", {})
+    synced = {}
+    counts = {"copied": [0, 0], "linked": [0, 0], "skipped": [0, 0], "deleted": [0, 0]}
+    changes = ChangeSet() if changes is None else changes
+
+    _copy_recursive(source_dir, dest_dir, source_dir, synced, counts, changes, previous, {})
+
+    # Orphans from a build that stopped before pruning them are still orphans
+    orphans = [rel_path for rel_path in previous if rel_path not in synced]
+    orphans += [
+        rel_path for rel_path in manifest.get("orphans", []) if rel_path not in synced and rel_path not in previous
+    ]
+    manifest["static"] = synced
+    if orphans:
+        manifest["orphans"] = orphans
+    else:
+        manifest.pop("orphans", None)
+    if prune:
+        counts["deleted"] = prune_orphans(dest_dir, changes, state)
+    if save_state:
+        state.save()
+    print(
+        "Static: "
+        + ", ".join(f"{n} {name} ({_format_bytes(size)})" for name, (n, size) in counts.items())
+    )
+    return counts
+
+def prune_orphans(public_dir, changes=None, state=None):
+    # Deletes the static files copy_static_files found orphaned, unless a
+    # page now has the same output path. Returns [files, bytes] deleted.
+    save_state = state is None
+    if save_state:
+        state = BuildState(public_dir)
+    manifest = state.manifest
+    orphans = manifest.pop("orphans", [])
+    deleted = [0, 0]
+    if not orphans:
+        return deleted
+    pages = _page_outputs(manifest)
+    for rel_path in orphans:
+        if rel_path in pages:
+            continue
+        size = _remove_output(os.path.join(public_dir, rel_path), public_dir, changes)
+        if size is not None:
+            deleted[0] += 1
+            deleted[1] += size
+    if save_state:
+        state.save()
+    print(f"Pruned: {deleted[0]} orphaned file(s) ({_format_bytes(deleted[1])})")
+    return deleted
+
+def _remove_output(path, public_dir, changes=None):
+    # Deletes an output file, its .gz sidecar and the directories they leave
+    # empty; returns its size, or None if it was already gone
+    if not os.path.isfile(path):
+        return None
+    size = os.path.getsize(path)
+    os.remove(path)
+    if changes is not None:
+        changes.record_removed(path)
+    # Left to the gzip pass, it would go without its directory
+    if os.path.isfile(path + ".gz"):
+        os.remove(path + ".gz")
+        if changes is not None:
+            changes.record_removed(path + ".gz")
+    _remove_empty_parents(path, public_dir)
+    print(f"Removed: {path}")
+    return size
+
+def _copy_recursive(source_dir, dest_dir, static_root, synced, counts, changes, previous, originals):
     # This is where the recursive copying logic goes
     # Loop through all items in the source directory
-    for item in os.listdir(source_dir):
-        source_path = os.path.join(source_dir, item)
-        dest_path = os.path.join(dest_dir, item)
-        
-        if os.path.isfile(source_path):
-            # If it's a file, copy it
-            shutil.copy(source_path, dest_path)
-            print(f"Copied file: {source_path} to {dest_path}")
+    for entry in os.scandir(source_dir):
+        dest_path = os.path.join(dest_dir, entry.name)
+
+        if entry.is_file():
+            source_stat = entry.stat()
+            rel_path = os.path.relpath(entry.path, static_root)
+            synced[rel_path] = {"size": source_stat.st_size, "mtime": source_stat.st_mtime_ns}
+            if is_image(entry.name):
+                # Content hash for dedupe and the image index, rehashed only if touched
+                old = previous.get(rel_path, {})
+                if old.get("size") == source_stat.st_size and old.get("mtime") == source_stat.st_mtime_ns:
+                    digest = old.get("hash") or hash_file(entry.path)
+                else:
+                    digest = hash_file(entry.path)
+                synced[rel_path]["hash"] = digest
+                original = originals.setdefault(digest, dest_path)
+                if original != dest_path:
+                    status = link_atomic(original, dest_path, digest)
+                    if status == UNCHANGED:
+                        _count(counts, "skipped", source_stat.st_size)
+                    else:
+                        changes.record(dest_path, status)
+                        _count(counts, "linked", source_stat.st_size)
+                        print(f"Linked file: {dest_path} to {original}")
+                    continue
+            if _is_same_file(entry.path, source_stat, dest_path):
+                _count(counts, "skipped", source_stat.st_size)
+                continue
+            # copy2 keeps the mtime, so the next build can skip it without hashing
+            changes.record(dest_path, copy_atomic(entry.path, dest_path))
+            _count(counts, "copied", source_stat.st_size)
+            print(f"Copied file: {entry.path} to {dest_path}")
         else:
             # If it's a directory, create it and recurse
             if not os.path.exists(dest_path):
                 os.mkdir(dest_path)
-            _copy_recursive(source_path, dest_path)
+            _copy_recursive(entry.path, dest_path, static_root, synced, counts, changes, previous, originals)
+
+def _is_same_file(source_path, source_stat, dest_path):
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    if dest_stat.st_size != source_stat.st_size:
+        return False
+    if dest_stat.st_mtime_ns == source_stat.st_mtime_ns:
+        return True
+    # Same size but touched: only the content can tell
+    if hash_file(source_path) != hash_file(dest_path):
+        return False
+    shutil.copystat(source_path, dest_path)
+    return True
+
+def _count(counts, name, size):
+    counts[name][0] += 1
+    counts[name][1] += size
+
+def _format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+def _remove_empty_parents(path, stop_dir):
+    directory = os.path.dirname(path)
+    stop_dir = os.path.abspath(stop_dir)
+    while os.path.abspath(directory) != stop_dir and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
 
-def process_markdown_files(content_dir, public_dir, template_path, basepath):
-    for root, dirs, files in os.walk(content_dir):
+def process_markdown_files(
+    content_dir, public_dir, template_path, basepath, jobs=1, changes=None,
+    block_cache_bytes=BLOCK_CACHE_BYTES, minify=False, blocks=None, hashes=None, drafts=False, cache_dir=None,
+    state=None,
+):
+    # blocks is a BlockCache to use instead of the one saved in cache_dir (or,
+    # without a cache_dir, one that only lasts this build); it is left to the
+    # caller to save, as is state, a BuildState to use instead of loading the
+    # manifest and indexes from public_dir. hashes is a HashCache for the
+    # markdown files, so unchanged ones aren't read just to be hashed. Pages
+    # marked as drafts in their front matter are skipped unless drafts is set.
+    hash_source = hash_file if hashes is None else hashes.hash
+    # Covers template.html and every partial it includes
+    template_hash = load_template(template_path).digest
+    save_state = state is None
+    if save_state:
+        state = BuildState(public_dir)
+    # Sizes of the images the static sync put in public_dir, for img tags
+    images = state.images()
+    options = _page_options(minify)
+
+    old_manifest = state.manifest
+    # Keep the sections other build steps own (such as "static")
+    manifest = dict(old_manifest, **new_manifest(template_hash, basepath, options))
+    reuse = inputs_match(old_manifest, template_hash, basepath, options)
+    if not reuse:
+        print("Template, basepath or options changed, regenerating every page.")
+    search_index = state.search()
+
+    sources = set()
+    pending = []
+    skipped = 0
+    drafted = 0
+    for root, dirs, files in profiler.timed_iter("walk", os.walk(content_dir)):
         # Calculate the relative path from content_dir to the current directory
         rel_path = os.path.relpath(root, content_dir)
         
@@ -75,28 +386,251 @@ def process_markdown_files(content_dir, public_dir, template_path, basepath):
         for file in files:
             if file.endswith('.md'):
                 md_path = os.path.join(root, file)
-                
-                # Determine the destination path
-                if file == 'index.md':
-                    # For index.md files, generate index.html in the same directory structure
-                    if rel_path == '.':
-                        html_path = os.path.join(public_dir, 'index.html')
-                    else:
-                        html_path = os.path.join(public_dir, rel_path, 'index.html')
-                else:
-                    # For non-index.md files, use the file name without .md extension
-                    html_name = file[:-3] + '.html'
-                    if rel_path == '.':
-                        html_path = os.path.join(public_dir, html_name)
-                    else:
-                        html_path = os.path.join(public_dir, rel_path, html_name)
-                
-                # Ensure the directory exists
-                os.makedirs(os.path.dirname(html_path), exist_ok=True)
-                
-                # Generate the HTML page
-                generate_pages_recursive(md_path, template_path, html_path, basepath)
-                print(f"Generated: {html_path} from {md_path}")
+                html_path = _html_path_for(public_dir, rel_path, file)
+                md_key = os.path.relpath(md_path, content_dir)
+                # Only the front matter is read here, so a draft costs next to nothing
+                with profiler.stage("front matter"):
+                    meta = _front_matter(md_path)
+                if meta.get("draft") and not drafts:
+                    # Its output from before it was a draft is removed with the stale pages
+                    drafted += 1
+                    continue
+                with profiler.stage("hash"):
+                    entry = _page_entry(md_path, html_path, public_dir, meta, template_path, hash_source)
+                sources.add(md_key)
+                manifest["pages"][md_key] = entry
+
+                # A page missing from the search index is rendered again to tokenize it
+                old_images = old_manifest["pages"].get(md_key, {}).get("images", {})
+                if (
+                    reuse
+                    and page_is_current(old_manifest, md_key, entry["hash"], public_dir, entry.get("template"))
+                    and images.unchanged(old_images, basepath)
+                    and search_index.has(entry["output"])
+                ):
+                    if old_images:
+                        entry["images"] = old_images
+                    skipped += 1
+                    continue
+                _add_page_images(entry, md_path, images, basepath)
+                pending.append((md_path, html_path, os.path.getsize(md_path)))
+
+    # Generate the HTML pages, in worker processes when jobs > 1
+    rendered = 0
+    failed = []
+    documents = {}
+    # Blocks rendered by earlier builds (and earlier pages) are reused as is
+    save_blocks = blocks is None
+    if save_blocks:
+        blocks = _load_blocks(cache_dir, block_cache_bytes)
+    stats = Counter()
+    for md_path, html_path, error in render_pages(
+        pending, template_path, basepath, jobs, changes, documents, blocks, minify, stats, images,
+    ):
+        if error:
+            failed.append((md_path, error))
+            # Leave it out of the manifest so the next build retries it
+            del manifest["pages"][os.path.relpath(md_path, content_dir)]
+            continue
+        print(f"Generated: {html_path} from {md_path}")
+        rendered += 1
+
+    removed = _remove_stale_pages(old_manifest, sources, public_dir, changes)
+    with profiler.stage("search index"):
+        search_index.update(documents, _page_outputs(manifest), basepath, changes)
+    state.manifest = manifest
+    if save_state:
+        state.save()
+    if pending:
+        if save_blocks:
+            blocks.save()
+        print(f"Blocks: {blocks.summary()}")
+    if stats["minify bytes in"]:
+        saved = stats["minify bytes in"] - stats["minify bytes out"]
+        print(f"Minify: saved {_format_bytes(saved)} ({saved / stats['minify bytes in']:.1%})")
+    print(f"Pages: {rendered} generated, {skipped} unchanged, {removed} removed, {drafted} drafts skipped.")
+    for md_path, error in failed:
+        print(f"Failed: {md_path}: {error}")
+    return failed
+
+def update_pages(
+    md_paths, content_dir, public_dir, template_path, basepath, changes=None, blocks=None, hashes=None,
+    drafts=False, cache_dir=None, minify=False, state=None,
+):
+    # Re-render only the given markdown files (or drop the outputs of deleted
+    # ones and drafts) without walking and hashing the rest of content/.
+    # blocks, hashes, drafts, cache_dir, minify and state are as for
+    # process_markdown_files.
+    template_hash = load_template(template_path).digest
+    save_state = state is None
+    if save_state:
+        state = BuildState(public_dir)
+    manifest = state.manifest
+    images = state.images()
+    if not inputs_match(manifest, template_hash, basepath, _page_options(minify)):
+        failed = process_markdown_files(
+            content_dir, public_dir, template_path, basepath, changes=changes, minify=minify, blocks=blocks,
+            hashes=hashes, drafts=drafts, cache_dir=cache_dir, state=state,
+        )
+        if save_state:
+            state.save()
+        return failed
+
+    pending = []
+    for md_path in md_paths:
+        md_key = os.path.relpath(md_path, content_dir)
+        meta = _front_matter(md_path) if os.path.isfile(md_path) else None
+        if meta is None or (meta.get("draft") and not drafts):
+            entry = manifest["pages"].pop(md_key, None)
+            if entry is not None:
+                _remove_output(os.path.join(public_dir, entry["output"]), public_dir, changes)
+            continue
+        rel_dir = os.path.relpath(os.path.dirname(md_path), content_dir)
+        html_path = _html_path_for(public_dir, rel_dir, os.path.basename(md_path))
+        manifest["pages"][md_key] = _page_entry(
+            md_path, html_path, public_dir, meta, template_path, hash_file if hashes is None else hashes.hash,
+        )
+        _add_page_images(manifest["pages"][md_key], md_path, images, basepath)
+        pending.append((md_path, html_path, os.path.getsize(md_path)))
+
+    failed = []
+    documents = {}
+    save_blocks = blocks is None
+    if save_blocks:
+        blocks = _load_blocks(cache_dir)
+    for md_path, html_path, error in render_pages(
+        pending, template_path, basepath, changes=changes, documents=documents, blocks=blocks, minify=minify,
+        images=images,
+    ):
+        if error:
+            failed.append((md_path, error))
+            del manifest["pages"][os.path.relpath(md_path, content_dir)]
+            print(f"Failed: {md_path}: {error}")
+            continue
+        print(f"Generated: {html_path} from {md_path}")
+    state.search().update(documents, _page_outputs(manifest), basepath, changes)
+    if save_state:
+        state.save()
+    if pending:
+        if save_blocks:
+            blocks.save()
+        print(f"Blocks: {blocks.summary()}")
+    return failed
+
+def rebuild_paths(
+    project_root, basepath, changed, gzip=True, blocks=None, hashes=None, minify=False, state=None,
+):
+    # Redoes only the part of the build the changed files (absolute paths)
+    # feed into: the static sync for static/, those pages for content/ and
+    # every page for anything else (the template or a partial). A static
+    # change that alters an image's size also checks every page, and
+    # re-renders those that show it. state is a BuildState kept between
+    # rebuilds; it is saved once at the end, along with the change list.
+    # Returns the pages that failed, as build does.
+    content_dir = os.path.join(project_root, "content")
+    static_dir = os.path.join(project_root, "static")
+    public_dir = os.path.join(project_root, "docs")
+    template_path = os.path.join(project_root, "template.html")
+    state = BuildState(public_dir) if state is None else state
+    changes = ChangeSet()
+    all_pages = any(not path.startswith((content_dir + os.sep, static_dir + os.sep)) for path in changed)
+    if any(path.startswith(static_dir + os.sep) for path in changed):
+        images_before = state.images().digest
+        copy_static_files(static_dir, public_dir, changes, state=state)
+        all_pages = all_pages or state.images().digest != images_before
+    failed = []
+    if all_pages:
+        failed = process_markdown_files(
+            content_dir, public_dir, template_path, basepath, changes=changes, minify=minify, blocks=blocks,
+            hashes=hashes, cache_dir=project_root, state=state,
+        )
+    else:
+        pages = [path for path in changed if path.startswith(content_dir + os.sep) and path.endswith(".md")]
+        if pages:
+            failed = update_pages(
+                pages, content_dir, public_dir, template_path, basepath, changes, blocks, hashes,
+                cache_dir=project_root, minify=minify, state=state,
+            )
+    if gzip:
+        # Keep the sidecars in step with just the outputs this rebuild touched
+        compress_outputs(public_dir, changes, manifest=state.manifest, changed_only=True)
+    else:
+        drop_stale_sidecars(public_dir, changes, state.manifest)
+    state.save()
+
+    # What this rebuild touched, as after a full build
+    changes.save(public_dir)
+    print(f"Changes: {changes.summary()}")
+    return failed
+
+def _load_blocks(cache_dir, max_bytes=BLOCK_CACHE_BYTES):
+    # Without a cache_dir, blocks are only shared between the pages of one build
+    if cache_dir is None:
+        return BlockCache(max_bytes=max_bytes)
+    return BlockCache.load(cache_dir, max_bytes)
+
+def _page_options(minify):
+    # Build inputs every page depends on, recorded in the manifest
+    options = {}
+    if minify:
+        options["minify"] = True
+    return options
+
+def _front_matter(md_path):
+    try:
+        return read_front_matter(md_path)
+    except (OSError, ValueError):
+        # Rendering the page reports the problem
+        return {}
+
+def _page_entry(md_path, html_path, public_dir, meta, template_path, hash_source=hash_file):
+    entry = {"hash": hash_source(md_path), "output": os.path.relpath(html_path, public_dir)}
+    if meta.get("template"):
+        # The manifest's template hash only covers template.html
+        try:
+            entry["template"] = load_template(page_template(meta, template_path)).digest
+        except (OSError, ValueError):
+            # Rendering fails and reports it, so the page is retried next build
+            entry["template"] = None
+    return entry
+
+def _add_page_images(entry, md_path, images, basepath):
+    # Records the sizes of the images the page shows, so it is rendered again
+    # when one of those changes rather than when any image in the site does.
+    # Read block by block, like a streamed page, so a huge page isn't loaded
+    # whole just for this.
+    sizes = {}
+    try:
+        with open(md_path, "r") as file:
+            read_header(file)
+            for block in parse_blocks(file):
+                sizes.update(images.sizes_in(block.text, basepath))
+    except (OSError, ValueError):
+        # Rendering fails and reports it
+        return
+    if sizes:
+        entry["images"] = sizes
+
+def _megabytes(size):
+    return int(size * 1024 * 1024)
+
+def _html_path_for(public_dir, rel_path, file):
+    return os.path.join(public_dir, page_output_path(os.path.normpath(os.path.join(rel_path, file))))
+
+def _page_outputs(manifest):
+    return {entry["output"] for entry in manifest["pages"].values()}
+
+def _remove_stale_pages(old_manifest, sources, public_dir, changes=None):
+    # Pages whose markdown source is gone would otherwise linger in docs/,
+    # unless a static file has taken over their output path
+    removed = 0
+    static = old_manifest.get("static", {})
+    for md_key, entry in old_manifest["pages"].items():
+        if md_key in sources or entry["output"] in static:
+            continue
+        if _remove_output(os.path.join(public_dir, entry["output"]), public_dir, changes) is not None:
+            removed += 1
+    return removed
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import time
+
+# The manifest lives next to the generated site and records the content hash
+# of every input that went into it, so the next build can skip pages whose
+# inputs did not change.
+MANIFEST_NAME = ".build-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1 << 16):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    # path -> ((mtime_ns, size), hash), for a process that hashes the same
+    # files build after build; a file is read again only once its stat changes.
+    # Stamps younger than RACY_SECONDS aren't trusted: the file could still
+    # change within the same mtime tick without its size changing.
+    RACY_SECONDS = 2
+
+    def __init__(self):
+        self.entries = {}
+
+    def hash(self, path):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        digest = hash_file(path)
+        if time.time() - stat.st_mtime > self.RACY_SECONDS:
+            self.entries[path] = (stamp, digest)
+        return digest
+
+
+def new_manifest(template_hash=None, basepath=None, options=None):
+    return {
+        "version": MANIFEST_VERSION,
+        "template": template_hash,
+        "basepath": basepath,
+        # Build options that change every page's output, such as minify
+        "options": options or {},
+        "pages": {},
+    }
+
+
+def load_manifest(public_dir):
+    path = os.path.join(public_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        # Missing or corrupt manifest: behave like a clean build
+        return new_manifest()
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return new_manifest()
+    manifest.setdefault("pages", {})
+    return manifest
+
+
+def save_manifest(public_dir, manifest):
+    os.makedirs(public_dir, exist_ok=True)
+    path = os.path.join(public_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    # Compact and serialized in one go: it is rewritten after every build
+    text = json.dumps(manifest, separators=(",", ":"), sort_keys=True)
+    with open(tmp_path, "w") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def inputs_match(manifest, template_hash, basepath, options=None):
+    # A template, basepath or option change affects every page, so it invalidates all of them
+    return (
+        manifest.get("template") == template_hash
+        and manifest.get("basepath") == basepath
+        and manifest.get("options", {}) == (options or {})
+    )
+
+
+def page_is_current(manifest, rel_path, source_hash, public_dir, template_hash=None):
+    # template_hash is the digest of the page's own template, if it has one
+    entry = manifest["pages"].get(rel_path)
+    if entry is None or entry.get("hash") != source_hash or entry.get("template") != template_hash:
+        return False
+    # An output deleted by hand still needs to be regenerated
+    return os.path.exists(os.path.join(public_dir, entry["output"]))
@@ -1,9 +1,27 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
 from enum import Enum
+import io
 import os
 
-from parentnode import ParentNode
+from parentnode import ParentNode, write_html
 from inline_markdown import text_to_textnodes
 from textnode import text_node_to_html_node, TextNode, TextType
+from blockcache import block_key
+from frontmatter import page_template, read_header, split_front_matter
+from minify import MinifyingWriter
+from output import AtomicFile
+import profiler
+from search import add_terms
+from template import load_template
+
+
+# Pages at least this big are rendered block by block straight from the file,
+# so memory depends on the largest block rather than on the file size
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+HEADING_MARKS = ("# ", "## ", "### ", "#### ", "##### ", "###### ")
 
 
 class BlockType(Enum):
@@ -15,173 +33,435 @@ class BlockType(Enum):
     ULIST = "unordered_list"
 
 
-def markdown_to_blocks(markdown):
-    blocks = markdown.split("\n\n")
-    filtered_blocks = []
-    for block in blocks:
-        if block == "":
+class Block:
+    # A block as the parser found it: lines are its source lines, content is
+    # what the renderer needs (paragraph lines, heading text, code body, quote
+    # lines or list item texts) and level is the heading level
+    __slots__ = ("block_type", "lines", "content", "level")
+
+    def __init__(self, block_type, lines, content, level=0):
+        self.block_type = block_type
+        self.lines = lines
+        self.content = content
+        self.level = level
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+
+def parse_blocks(lines):
+    # One forward pass over lines (a list of strings or an open file). Blank
+    # lines end a block, except inside a ``` fence, which runs to its closing
+    # fence (or the end of the document) whatever it contains.
+    block_lines = []
+    code_lines = None
+    for line in lines:
+        if line.endswith("\n"):
+            line = line[:-1]
+        if code_lines is not None:
+            code_lines.append(line)
+            if _is_closing_fence(line):
+                yield _code_block(code_lines, closed=True)
+                code_lines = None
             continue
-        block = block.strip()
-        filtered_blocks.append(block)
-    return filtered_blocks
+        if _is_opening_fence(line):
+            if block_lines:
+                yield _make_block(block_lines)
+                block_lines = []
+            code_lines = [line.lstrip()]
+        elif line.strip() == "":
+            if block_lines:
+                yield _make_block(block_lines)
+                block_lines = []
+        else:
+            block_lines.append(line)
+    if code_lines is not None:
+        yield _code_block(code_lines, closed=False)
+    if block_lines:
+        yield _make_block(block_lines)
 
 
-def block_to_block_type(block):
-    lines = block.split("\n")
+def _is_opening_fence(line):
+    # ```lang opens a fence, but ```inline code``` on one line doesn't
+    stripped = line.lstrip()
+    return stripped.startswith("```") and "`" not in stripped[3:]
+
+
+def _is_closing_fence(line):
+    stripped = line.strip()
+    return stripped.startswith("```") and not stripped.strip("`")
+
+
+def _code_block(lines, closed):
+    body = lines[1:-1] if closed else lines[1:]
+    return Block(BlockType.CODE, lines, "".join(line + "\n" for line in body))
 
-    if block.startswith(("# ", "## ", "### ", "#### ", "##### ", "###### ")):
-        return BlockType.HEADING
-    if len(lines) > 1 and lines[0].startswith("```") and lines[-1].startswith("```"):
-        return BlockType.CODE
-    if block.startswith(">"):
+
+def _make_block(lines):
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    first = lines[0]
+
+    if first.startswith(HEADING_MARKS):
+        level = first.index(" ")
+        # Like a paragraph, a heading runs to the next blank line
+        return Block(BlockType.HEADING, lines, "\n".join(lines)[level + 1 :], level)
+    if first.startswith(">"):
+        content = []
         for line in lines:
             if not line.startswith(">"):
-                return BlockType.PARAGRAPH
-        return BlockType.QUOTE
-    if block.startswith("- "):
+                return Block(BlockType.PARAGRAPH, lines, lines)
+            content.append(line.lstrip(">").strip())
+        return Block(BlockType.QUOTE, lines, content)
+    if first.startswith("- "):
+        content = []
         for line in lines:
             if not line.startswith("- "):
-                return BlockType.PARAGRAPH
-        return BlockType.ULIST
-    if block.startswith("1. "):
-        i = 1
-        for line in lines:
-            if not line.startswith(f"{i}. "):
-                return BlockType.PARAGRAPH
-            i += 1
-        return BlockType.OLIST
+                return Block(BlockType.PARAGRAPH, lines, lines)
+            content.append(line[2:])
+        return Block(BlockType.ULIST, lines, content)
+    if first.startswith("1. "):
+        content = []
+        for number, line in enumerate(lines, 1):
+            marker = f"{number}. "
+            if not line.startswith(marker):
+                return Block(BlockType.PARAGRAPH, lines, lines)
+            content.append(line[len(marker):])
+        return Block(BlockType.OLIST, lines, content)
+    return Block(BlockType.PARAGRAPH, lines, lines)
+
+
+def markdown_to_blocks(markdown):
+    return [block.text for block in parse_blocks(markdown.split("\n"))]
+
+
+def iter_markdown_blocks(file):
+    # Yields the same blocks as markdown_to_blocks(file.read()) while only
+    # holding the block being read in memory
+    for block in parse_blocks(file):
+        yield block.text
+
+
+def block_to_block_type(block):
+    for parsed in parse_blocks(block.split("\n")):
+        return parsed.block_type
     return BlockType.PARAGRAPH
 
 
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
+def markdown_to_html_node(markdown, basepath="/"):
+    with profiler.stage("block parse"):
+        blocks = list(parse_blocks(markdown.split("\n")))
     children = []
     for block in blocks:
-        html_node = block_to_html_node(block)
+        with profiler.stage("block parse"):
+            html_node = block_to_html_node(block, basepath)
         children.append(html_node)
     return ParentNode("div", children, None)
 
 
-def block_to_html_node(block):
-    block_type = block_to_block_type(block)
+def markdown_to_html_many(markdowns, basepath="/", jobs=1, cache=None):
+    # Renders an iterable of markdown strings to a list of HTML strings, each
+    # the same as markdown_to_html_node(markdown, basepath).to_html().
+    # Identical inputs are rendered once, and blocks repeated across inputs
+    # share one rendering through cache (pass a dict to keep it between
+    # calls). An input that fails gets its exception in its place instead of
+    # raising. With jobs > 1 the distinct inputs are split over worker
+    # processes, each with its own block cache.
+    markdowns = list(markdowns)
+    unique = list(dict.fromkeys(markdowns))
+    if jobs > 1 and len(unique) > 1:
+        size = -(-len(unique) // (jobs * 4))
+        chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+        rendered = []
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(_render_many, chunk, basepath) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                try:
+                    rendered.extend(future.result())
+                except Exception as e:
+                    # The worker itself died; every input it had fails with it
+                    rendered.extend(e for _ in chunk)
+    else:
+        rendered = _render_many(unique, basepath, cache)
+    by_markdown = dict(zip(unique, rendered))
+    return [by_markdown[markdown] for markdown in markdowns]
+
+
+def _render_many(markdowns, basepath, cache=None):
+    cache = {} if cache is None else cache
+    results = []
+    for markdown in markdowns:
+        try:
+            results.append(_render_with_cache(markdown, basepath, cache))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _render_with_cache(markdown, basepath, cache):
+    parts = ["<div>"]
+    for block in parse_blocks(markdown.split("\n")):
+        key = (basepath, block.text)
+        html = cache.get(key)
+        if html is None:
+            chunks = []
+            write_html(block_to_html_node(block, basepath), chunks)
+            html = cache[key] = "".join(chunks)
+        parts.append(html)
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def block_to_html_node(block, basepath="/"):
+    # block is a Block from parse_blocks. basepath is applied to link and
+    # image URLs as their nodes are built; code blocks are left exactly as written
+    block_type = block.block_type
     if block_type == BlockType.PARAGRAPH:
-        return paragraph_to_html_node(block)
+        return paragraph_to_html_node(block.content, basepath)
     if block_type == BlockType.HEADING:
-        return heading_to_html_node(block)
+        return heading_to_html_node(block.level, block.content, basepath)
     if block_type == BlockType.CODE:
-        return code_to_html_node(block)
+        return code_to_html_node(block.content)
     if block_type == BlockType.OLIST:
-        return olist_to_html_node(block)
+        return olist_to_html_node(block.content, basepath)
     if block_type == BlockType.ULIST:
-        return ulist_to_html_node(block)
+        return ulist_to_html_node(block.content, basepath)
     if block_type == BlockType.QUOTE:
-        return quote_to_html_node(block)
+        return quote_to_html_node(block.content, basepath)
     raise ValueError("invalid block type")
 
 
-def text_to_children(text):
-    text_nodes = text_to_textnodes(text)
-    children = []
-    for text_node in text_nodes:
-        html_node = text_node_to_html_node(text_node)
-        children.append(html_node)
+def text_to_children(text, basepath="/"):
+    with profiler.stage("inline parse"):
+        text_nodes = text_to_textnodes(text)
+        children = []
+        for text_node in text_nodes:
+            html_node = text_node_to_html_node(text_node, basepath)
+            children.append(html_node)
     return children
 
-def paragraph_to_html_node(block):
-    lines = block.split("\n")
+def paragraph_to_html_node(lines, basepath="/"):
     paragraph = " ".join(lines)
-    children = text_to_children(paragraph)
+    children = text_to_children(paragraph, basepath)
     return ParentNode("p", children)
 
-def heading_to_html_node(block):
-    level = 0
-    for char in block:
-        if char == "#":
-            level += 1
-        else:
-            break
-    if level + 1 >= len(block):
+def heading_to_html_node(level, text, basepath="/"):
+    if not 1 <= level <= 6:
         raise ValueError(f"invalid heading level: {level}")
-    text = block[level + 1 :]
-    children = text_to_children(text)
+    children = text_to_children(text, basepath)
     return ParentNode(f"h{level}", children)
 
-def code_to_html_node(block):
-    if not block.startswith("```") or not block.endswith("```"):
-        raise ValueError("invalid code block")
-    text = block[4:-3]
-    raw_text_node = TextNode(text, TextType.TEXT)
+def code_to_html_node(body):
+    raw_text_node = TextNode(body, TextType.TEXT)
     child = text_node_to_html_node(raw_text_node)
     code = ParentNode("code", [child])
     return ParentNode("pre", [code])
 
-def olist_to_html_node(block):
-    items = block.split("\n")
+def olist_to_html_node(items, basepath="/"):
     html_items = []
-    for item in items:
-        text = item[3:]
-        children = text_to_children(text)
+    for text in items:
+        children = text_to_children(text, basepath)
         html_items.append(ParentNode("li", children))
     return ParentNode("ol", html_items)
 
-def ulist_to_html_node(block):
-    items = block.split("\n")
+def ulist_to_html_node(items, basepath="/"):
     html_items = []
-    for item in items:
-        text = item[2:]
-        children = text_to_children(text)
+    for text in items:
+        children = text_to_children(text, basepath)
         html_items.append(ParentNode("li", children))
     return ParentNode("ul", html_items)
 
-def quote_to_html_node(block):
-    lines = block.split("\n")
-    new_lines = []
-    for line in lines:
-        if not line.startswith(">"):
-            raise ValueError("invalid quote block")
-        new_lines.append(line.lstrip(">").strip())
-    content = " ".join(new_lines)
-    children = text_to_children(content)
+def quote_to_html_node(lines, basepath="/"):
+    # lines are the quote's lines with their ">" already removed
+    content = " ".join(lines)
+    children = text_to_children(content, basepath)
     return ParentNode("blockquote", children)
 
 def extract_title(markdown):
-    lines = markdown.split('\n')
+    # markdown is the document text, or an open file to scan line by line
+    lines = markdown.split('\n') if isinstance(markdown, str) else markdown
     for line in lines:
         if line.startswith('# '):
             # Strip the '# ' and any leading/trailing whitespace
             return line[2:].strip()
     raise Exception("No h1 header found in Markdown file.")
     
-def generate_page(from_path, template_path, dest_path, basepath):
+def generate_page(
+    from_path, template_path, dest_path, basepath, stream=None, changes=None, documents=None,
+    blocks=None, minify=False, stats=None, images=None,
+):
+    # The page is written atomically and only if its bytes changed; when a
+    # ChangeSet is passed, the outcome is recorded in it. When documents is a
+    # dict, the page's title and word counts are added to it for the search
+    # index. blocks is a BlockCache of already rendered blocks to reuse.
+    # minify passes the page through MinifyingWriter as it is written, adding
+    # the bytes before and after to stats (a Counter) if given. images is an
+    # ImageIndex used to give img tags their size and lazy loading.
     print(f"Generating page from {from_path} to {dest_path} using {template_path}.")
-    
+    with profiler.page(from_path):
+        if stream is None:
+            try:
+                stream = os.path.getsize(from_path) >= STREAM_THRESHOLD
+            except OSError as e:
+                return f"Error {e}"
+        output = AtomicFile(dest_path)
+        if stream:
+            # Not cached: keeping every block of a huge page would undo streaming
+            error = _stream_page(from_path, template_path, output, basepath, documents, minify, stats, images)
+        else:
+            error = _generate_page(
+                from_path, template_path, output, basepath, documents, blocks, minify, stats, images,
+            )
+        if error is None and changes is not None:
+            changes.record(dest_path, output.status)
+        return error
+
+def _stream_page(
+    from_path, template_path, output, basepath, documents=None, minify=False, stats=None, images=None,
+):
+    # Same output as _generate_page, but each block is parsed, rendered and
+    # written before the next one is read
+    try:
+        source = open(from_path, 'r')
+    except Exception as e:
+        return f"Error {e}"
+
+    with source:
+        try:
+            meta = read_header(source)
+            template = load_template(page_template(meta, template_path))
+        except Exception as e:
+            return f"Error {e}"
+        body_start = source.tell()
+        with profiler.stage("block parse"):
+            title = meta.get("title") or extract_title(source)
+        source.seek(body_start)
+        terms = Counter()
+
+        def write_content(out):
+            out.write("<div>")
+            write_blocks(parse_blocks(source), out, basepath, terms=terms, images=images)
+            out.write("</div>")
+
+        _make_parent_dirs(output.path)
+        with output as file, _minifying(file, minify, stats) as out:
+            template.render(out, {"Title": title, "Content": write_content}, basepath)
+        if documents is not None:
+            documents[output.path] = (title, terms)
+
+@contextlib.contextmanager
+def _minifying(out, minify, stats):
+    # out itself, or a MinifyingWriter around it that is flushed on exit
+    if not minify:
+        yield out
+        return
+    writer = MinifyingWriter(out)
+    yield writer
+    writer.close()
+    if stats is not None:
+        stats["minify bytes in"] += writer.bytes_in
+        stats["minify bytes out"] += writer.bytes_out
+
+def _make_parent_dirs(dest_path):
+    directory = os.path.dirname(dest_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+def _generate_page(
+    from_path, template_path, output, basepath, documents=None, blocks=None, minify=False, stats=None,
+    images=None,
+):
     try:
-        with open(from_path, 'r') as file:
+        with profiler.stage("read"), open(from_path, 'r') as file:
             markdown_content = file.read()
     except Exception as e:
         return f"Error {e}"
 
     try:
-        with open(template_path, 'r') as file:
-            template = file.read()
+        # Compiled once and reused until template.html or a partial changes;
+        # a page can name its own template in its front matter
+        with profiler.stage("template load"):
+            meta, _ = split_front_matter(markdown_content)
+            template = load_template(page_template(meta, template_path))
     except Exception as e:
         return f"Error {e}"
-    
-    node = markdown_to_html_node(markdown_content)
-    html = node.to_html()
-    title = extract_title(markdown_content)
 
-    template = template.replace("{{ Title }}", title).replace("{{ Content }}", html)
+    _make_parent_dirs(output.path)
+    terms = None if documents is None else Counter()
+    if profiler.is_active():
+        # Render into memory first so rendering and disk writes are timed apart
+        buffer = io.StringIO()
+        with profiler.stage("template"):
+            title = write_page(markdown_content, template, buffer, basepath, blocks, terms, images, minify, stats)
+        with profiler.stage("write"), output as file:
+            file.write(buffer.getvalue())
+    else:
+        with output as file:
+            title = write_page(markdown_content, template, file, basepath, blocks, terms, images, minify, stats)
 
-    template = template.replace('href="/', f'href="{basepath}')
-    template = template.replace('src="/', f'src="{basepath}')
+    if documents is not None:
+        documents[output.path] = (title, terms)
 
-    directory = os.path.dirname(dest_path)
-    if directory and not os.path.exists(directory):
-        os.makedirs(directory)
+def write_page(
+    markdown, template, out, basepath="/", blocks=None, terms=None, images=None, minify=False, stats=None,
+):
+    # The page pipeline every build shares: the disk build (generate_page),
+    # build_site and the on-demand previewer all render a page through here,
+    # so the same options give the same bytes. render_page, minified on the
+    # way to out when minify is set; returns the title.
+    with _minifying(out, minify, stats) as writer:
+        return render_page(markdown, template, writer, basepath, blocks, terms, images)
+
+def render_page(markdown, template, out, basepath="/", blocks=None, terms=None, images=None):
+    # Renders a whole page through a compiled Template into out (anything
+    # with a write method) and returns its title; its word counts are added
+    # to terms if given. Both the disk build and in-memory builds go through
+    # here. A title in the front matter takes the place of the first h1.
+    with profiler.stage("block parse"):
+        meta, body = split_front_matter(markdown)
+        title = meta.get("title") or extract_title(body)
+        parsed = list(parse_blocks(body.split("\n")))
+
+    def write_content(out):
+        out.write("<div>")
+        write_blocks(parsed, out, basepath, blocks, terms, images)
+        out.write("</div>")
+
+    template.render(out, {"Title": title, "Content": write_content}, basepath)
+    return title
 
-    with open(dest_path, "w") as file:
-        file.write(template)
+def write_blocks(parsed, out, basepath="/", blocks=None, terms=None, images=None):
+    # Writes each block's HTML to out, the same as the blocks of
+    # markdown_to_html_node, adding their words to terms if given. With a
+    # BlockCache, blocks already in it are copied from it and the others are
+    # added to it. With an ImageIndex, img tags get their size filled in.
+    for block in parsed:
+        entry = None
+        if blocks is not None:
+            # Keyed on the sizes of its own images, not on every image in the site
+            key = block_key(block, basepath, "" if images is None else images.variant(block.text, basepath))
+            entry = blocks.get(key)
+        if entry is None:
+            with profiler.stage("block parse"):
+                node = block_to_html_node(block, basepath)
+                if images is not None:
+                    images.annotate(node, basepath)
+            if blocks is None:
+                with profiler.stage("render"):
+                    write_html(node, out)
+                if terms is not None:
+                    with profiler.stage("search terms"):
+                        add_terms(node, terms)
+                continue
+            chunks = []
+            with profiler.stage("render"):
+                write_html(node, chunks)
+            with profiler.stage("search terms"):
+                entry = blocks.put(key, "".join(chunks), add_terms(node, Counter()))
+        out.write(entry[0])
+        if terms is not None:
+            terms.update(entry[1])
 
 def generate_pages_recursive(from_path, template_path, dest_path, basepath):
     # Base case: if from_path is a file (not a directory)
@@ -189,7 +469,7 @@ def generate_pages_recursive(from_path, template_path, dest_path, basepath):
         if from_path.endswith(".md"):
             # Construct the destination path by replacing .md with .html
             dest_file_path = dest_path[:-3] + ".html" if dest_path.endswith(".md") else dest_path
-            generate_page(from_path, template_path, dest_file_path, basepath)
+            return generate_page(from_path, template_path, dest_file_path, basepath)
         return
     
     for sub_path in os.listdir(from_path):
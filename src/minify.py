@@ -0,0 +1,139 @@
+import re
+
+# Contents of these elements are passed through byte for byte: whitespace is
+# significant in pre/textarea and inside code, and script/style aren't HTML
+RAW_TAGS = ("pre", "code", "textarea", "script", "style")
+# Whitespace between two tags can only be dropped when one of them is one of
+# these: between inline elements it renders as a space ("<a>Home</a> <a>")
+BLOCK_TAGS = {
+    "address", "article", "aside", "base", "blockquote", "body", "dd", "details", "dialog", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "head", "header",
+    "hgroup", "hr", "html", "li", "link", "main", "meta", "nav", "ol", "p", "pre", "script", "section", "style",
+    "summary", "table", "tbody", "td", "tfoot", "th", "thead", "title", "tr", "ul",
+}
+TAG_NAME_PATTERN = re.compile(r"</?([a-zA-Z][a-zA-Z0-9-]*)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# Text longer than this with no tag in sight is written out without waiting
+MAX_PENDING = 64 * 1024
+
+
+class MinifyingWriter:
+    # Wraps a text file and minifies what is written to it, chunk by chunk:
+    # comments are dropped, whitespace runs in text become one space, and
+    # whitespace-only text holding a line break between two tags (template
+    # indentation) is removed when either tag is in BLOCK_TAGS and becomes one
+    # space otherwise. Tags themselves are written unchanged.
+    # close() flushes whatever is still pending; it doesn't close out.
+    def __init__(self, out):
+        self.out = out
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._pending = ""
+        self._raw_until = None
+        self._after_tag = True
+        # Indentation after a tag, kept until the next tag says whether it goes
+        self._held = False
+        self._block_before = True
+        # Whether the output ends in a space, so text after a dropped comment
+        # doesn't add a second one
+        self._space_before = False
+
+    def write(self, chunk):
+        self.bytes_in += len(chunk.encode())
+        self._pending += chunk
+        self._process(final=False)
+
+    def close(self):
+        self._process(final=True)
+
+    def _emit(self, text):
+        if text:
+            self.bytes_out += len(text.encode())
+            self.out.write(text)
+
+    def _process(self, final):
+        pending = self._pending
+        position = 0
+        while position < len(pending):
+            if self._raw_until is not None:
+                end = pending.lower().find(self._raw_until, position)
+                if end == -1:
+                    # Hold back what could be the start of the closing tag
+                    keep = 0 if final else len(self._raw_until) - 1
+                    cut = max(position, len(pending) - keep)
+                    self._emit(pending[position:cut])
+                    position = cut
+                    break
+                self._emit(pending[position:end])
+                position = end
+                self._raw_until = None
+                continue
+
+            start = pending.find("<", position)
+            if start == -1:
+                if not final and len(pending) - position < MAX_PENDING:
+                    break
+                # The end of the page counts as a boundary like a tag does
+                self._text(pending[position:], before_tag=final)
+                position = len(pending)
+                break
+            if start > position:
+                self._text(pending[position:start], before_tag=True)
+                position = start
+
+            if pending.startswith("<!--", position):
+                end = pending.find("-->", position + 4)
+                if end == -1:
+                    if not final:
+                        break
+                    end = len(pending) - 3
+                position = end + 3
+                continue
+
+            end = pending.find(">", position)
+            if end == -1:
+                if not final:
+                    break
+                end = len(pending) - 1
+            tag = pending[position:end + 1]
+            match = TAG_NAME_PATTERN.match(tag)
+            name = match.group(1).lower() if match else None
+            if self._held and not self._block_before and name not in BLOCK_TAGS:
+                self._emit(" ")
+            self._held = False
+            self._emit(tag)
+            self._after_tag = True
+            self._block_before = name in BLOCK_TAGS
+            self._space_before = False
+            position = end + 1
+            if name in RAW_TAGS and not tag.startswith("</") and not tag.endswith("/>"):
+                self._raw_until = "</" + name
+        self._pending = pending[position:]
+
+    def _text(self, text, before_tag):
+        if not text.strip() and self._after_tag and before_tag and "\n" in text:
+            self._held = True
+            return
+        text = WHITESPACE_PATTERN.sub(" ", text)
+        if self._held and not self._block_before:
+            text = " " + text.lstrip(" ")
+        self._held = False
+        if self._space_before:
+            text = text.lstrip(" ")
+        self._emit(text)
+        if text:
+            self._space_before = text.endswith(" ")
+        self._after_tag = False
+
+
+def minify_html(html):
+    parts = []
+    writer = MinifyingWriter(_PartsWriter(parts))
+    writer.write(html)
+    writer.close()
+    return "".join(parts)
+
+
+class _PartsWriter:
+    def __init__(self, parts):
+        self.write = parts.append
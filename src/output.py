@@ -0,0 +1,132 @@
+import json
+import os
+import secrets
+import shutil
+
+from manifest import hash_file
+
+# Written next to the site after every build: which output paths were added,
+# changed or removed, for targeted uploads and CDN invalidation
+CHANGES_NAME = ".changes.json"
+
+ADDED = "added"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+class ChangeSet:
+    def __init__(self):
+        self.added = set()
+        self.changed = set()
+        self.removed = set()
+
+    def record(self, path, status):
+        if status == ADDED:
+            self.added.add(path)
+        elif status == CHANGED:
+            self.changed.add(path)
+
+    def record_removed(self, path):
+        self.removed.add(path)
+
+    def merge(self, other):
+        self.added |= other.added
+        self.changed |= other.changed
+        self.removed |= other.removed
+
+    def to_dict(self, public_dir):
+        def relative(paths):
+            return sorted(os.path.relpath(path, public_dir) for path in paths)
+        return {
+            "added": relative(self.added),
+            "changed": relative(self.changed),
+            "removed": relative(self.removed),
+        }
+
+    def save(self, public_dir):
+        path = os.path.join(public_dir, CHANGES_NAME)
+        with AtomicFile(path) as file:
+            json.dump(self.to_dict(public_dir), file, indent=1)
+            file.write("\n")
+
+    def summary(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+class AtomicFile:
+    # Writes go to a temporary file next to path. On a clean exit it replaces
+    # path only if the bytes differ, so identical outputs keep their mtime and
+    # readers never see a half-written file. status says what happened.
+    def __init__(self, path, mode="w"):
+        self.path = path
+        self.mode = mode
+        self.status = None
+        directory, name = os.path.split(path)
+        self._tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self._tmp_path, self.mode.replace("w", "x"))
+        return self._file
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return False
+        self.status = replace_if_changed(self._tmp_path, self.path)
+        return False
+
+
+def replace_if_changed(tmp_path, path):
+    try:
+        existing_size = os.path.getsize(path)
+    except FileNotFoundError:
+        os.replace(tmp_path, path)
+        return ADDED
+    if existing_size == os.path.getsize(tmp_path) and hash_file(tmp_path) == hash_file(path):
+        os.remove(tmp_path)
+        return UNCHANGED
+    os.replace(tmp_path, path)
+    return CHANGED
+
+
+def copy_atomic(source_path, dest_path):
+    # copy2 into a temporary name, then rename over the destination
+    directory, name = os.path.split(dest_path)
+    tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+    existed = os.path.exists(dest_path)
+    try:
+        shutil.copy2(source_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return CHANGED if existed else ADDED
+
+
+def link_atomic(source_path, dest_path, digest=None):
+    # Makes dest_path another name for the file at source_path (a hard link),
+    # so identical bytes are stored once. digest is the content hash, if
+    # known: a destination that already held those bytes counts as
+    # unchanged. Falls back to a copy where hard links aren't supported.
+    try:
+        if os.path.samefile(source_path, dest_path):
+            return UNCHANGED
+        status = UNCHANGED if digest is not None and hash_file(dest_path) == digest else CHANGED
+    except FileNotFoundError:
+        status = ADDED
+    directory, name = os.path.split(dest_path)
+    tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        copy_atomic(source_path, dest_path)
+        return status
+    try:
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return status
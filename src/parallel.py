@@ -0,0 +1,128 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from blockcache import BlockCache
+from markdown_blocks import generate_page
+from output import ChangeSet
+
+# Small pages are grouped so a worker round trip carries enough work to be
+# worth the pickling; a batch closes at whichever limit is reached first.
+BATCH_BYTES = 256 * 1024
+BATCH_FILES = 64
+
+# Each worker process's own BlockCache, loaded once when the worker starts
+_worker_blocks = None
+
+
+def make_batches(pages, jobs):
+    # Aim for a few batches per worker so one slow batch can't stall the pool
+    total = sum(size for _, _, size in pages)
+    target = max(1, min(BATCH_BYTES, total // (jobs * 4) or 1))
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for md_path, html_path, size in pages:
+        batch.append((md_path, html_path))
+        batch_bytes += size
+        if batch_bytes >= target or len(batch) >= BATCH_FILES:
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _load_worker_blocks(cache_dir, max_bytes):
+    global _worker_blocks
+    if cache_dir is None:
+        _worker_blocks = BlockCache()
+    else:
+        _worker_blocks = BlockCache.load(cache_dir, max_bytes)
+
+
+class BatchReport:
+    # What rendering a batch produced, handed back from the worker: a
+    # (md_path, html_path, error) per page with error None on success, the
+    # ChangeSet of the outputs written, the search documents (see
+    # generate_page), counters such as bytes saved by minifying, and what the
+    # block cache learned (see BlockCache.drain), if there is one
+    def __init__(self):
+        self.results = []
+        self.changes = ChangeSet()
+        self.documents = {}
+        self.stats = Counter()
+        self.learned = None
+
+    def merge_into(self, changes, documents, stats, blocks):
+        changes.merge(self.changes)
+        documents.update(self.documents)
+        stats.update(self.stats)
+        if self.learned is not None:
+            blocks.absorb(self.learned)
+
+
+def render_batch(batch, template_path, basepath, blocks=None, minify=False, images=None):
+    # A failing page never takes the rest of its batch down with it
+    blocks = _worker_blocks if blocks is None else blocks
+    report = BatchReport()
+    for md_path, html_path in batch:
+        try:
+            os.makedirs(os.path.dirname(html_path), exist_ok=True)
+            error = generate_page(
+                md_path, template_path, html_path, basepath,
+                changes=report.changes, documents=report.documents, blocks=blocks,
+                minify=minify, stats=report.stats, images=images,
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        report.results.append((md_path, html_path, error))
+    if blocks is not None:
+        report.learned = blocks.drain()
+    return report
+
+
+def render_pages(
+    pages, template_path, basepath, jobs=1, changes=None, documents=None, blocks=None,
+    minify=False, stats=None, images=None,
+):
+    # pages is a list of (md_path, html_path, size_in_bytes); written outputs
+    # are recorded in changes, search documents added to documents, rendered
+    # blocks reused from and added to blocks and counters added to stats,
+    # when they are given; images (an ImageIndex) sizes img tags. Returns the
+    # (md_path, html_path, error) results.
+    changes = ChangeSet() if changes is None else changes
+    documents = {} if documents is None else documents
+    stats = Counter() if stats is None else stats
+    if jobs <= 1 or len(pages) <= 1:
+        report = render_batch(
+            [(md, html) for md, html, _ in pages], template_path, basepath, blocks, minify, images,
+        )
+        report.merge_into(changes, documents, stats, blocks)
+        return report.results
+
+    results = []
+    batches = make_batches(pages, jobs)
+    if blocks is None:
+        initializer, initargs = None, ()
+    else:
+        # Workers start from what the cache held at the end of the last build
+        cache_dir = blocks.path and os.path.dirname(blocks.path)
+        initializer, initargs = _load_worker_blocks, (cache_dir, blocks.max_bytes)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+        futures = {
+            pool.submit(render_batch, batch, template_path, basepath, None, minify, images): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            try:
+                report = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed or unpicklable result)
+                for md_path, html_path in futures[future]:
+                    results.append((md_path, html_path, f"{type(e).__name__}: {e}"))
+                continue
+            results.extend(report.results)
+            report.merge_into(changes, documents, stats, blocks)
+    return results
@@ -1,6 +1,8 @@
 from htmlnode import HTMLNode # import parent class
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
         super().__init__(tag, "", children, props)
         if tag is None or children is None:
@@ -11,15 +13,39 @@ class ParentNode(HTMLNode):
             raise ValueError("No tag.")
         elif not self.children:
             return f"<{self.tag}></{self.tag}>"
+        
+        # Rendering goes through write_html, which walks the tree with its own
+        # stack, so deeply nested documents can't hit the recursion limit
+        parts = []
+        write_html(self, parts)
+        return "".join(parts)
+
+    def open_tag(self):
         if self.props is not None:
-            props_string = super().props_to_html()
-            final_html = f"<{self.tag}{props_string}>"
+            return f"<{self.tag}{self.props_to_html()}>"
+        return f"<{self.tag}>"
+
+
+def write_html(node, sink):
+    # Writes node as HTML to sink, a file-like object or a list of chunks.
+    # Produces the same bytes as node.to_html() without building a string
+    # per subtree.
+    write = sink.append if isinstance(sink, list) else sink.write
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            # closing tag pushed when its parent was opened
+            write(item)
+        elif isinstance(item, ParentNode):
+            if item.tag is None:
+                raise ValueError("No tag.")
+            elif not item.children:
+                write(f"<{item.tag}></{item.tag}>")
+                continue
+            write(item.open_tag())
+            stack.append(f"</{item.tag}>")
+            stack.extend(reversed(item.children))
         else:
-            final_html = f"<{self.tag}>"
-        
-        # Base case: If a child is a LeafNode, its to_html() does not recurse.
-        # Recursive case: If a child is a ParentNode, its to_html() calls its children.
-        children_html = "".join(child.to_html() for child in self.children)
-        
-        final_html += f"{children_html}</{self.tag}>" 
-        return final_html
\ No newline at end of file
+            # Leaf nodes render themselves without recursing
+            write(item.to_html())
\ No newline at end of file
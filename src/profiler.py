@@ -0,0 +1,135 @@
+import contextlib
+import cProfile
+import time
+import tracemalloc
+
+# The profiler the build is reporting to, if any. Instrumented code calls the
+# module-level stage()/page() helpers, which cost next to nothing when no
+# profiler is active.
+_active = None
+_NO_OP = contextlib.nullcontext()
+
+
+class _Frame:
+    __slots__ = ("name", "is_page", "started", "memory", "peak", "child_time")
+
+    def __init__(self, name, is_page, memory):
+        self.name = name
+        self.is_page = is_page
+        self.started = time.perf_counter()
+        self.memory = memory
+        self.peak = memory
+        self.child_time = 0.0
+
+
+class Profiler:
+    def __init__(self, dump_path=None):
+        # name -> [calls, total seconds, self seconds, peak bytes]
+        self.stages = {}
+        # page -> [seconds, peak bytes]
+        self.pages = {}
+        self.dump_path = dump_path
+        self._stack = []
+        self._cprofile = None
+
+    def start(self):
+        global _active
+        _active = self
+        tracemalloc.start()
+        if self.dump_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def stop(self):
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.dump_path)
+        tracemalloc.stop()
+        _active = None
+
+    @contextlib.contextmanager
+    def measure(self, name, is_page=False):
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # Remember the enclosing frame's peak before resetting it for ours
+            parent = self._stack[-1]
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        frame = _Frame(name, is_page, current)
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame.started
+            frame.peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+            self._stack.pop()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_time += elapsed
+                parent.peak = max(parent.peak, frame.peak)
+            self._record(frame, elapsed)
+
+    def _record(self, frame, elapsed):
+        used = frame.peak - frame.memory
+        if frame.is_page:
+            # Pages are reported separately; only the stages inside a page
+            # count against the enclosing stage's self time
+            if self._stack:
+                self._stack[-1].child_time += frame.child_time - elapsed
+            self.pages[frame.name] = [elapsed, used]
+            return
+        stats = self.stages.setdefault(frame.name, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - frame.child_time
+        stats[3] = max(stats[3], used)
+
+    def report(self, top=10):
+        lines = ["", "Stage                   calls   total s    self s   peak MB"]
+        for name, (calls, total, own, peak) in sorted(self.stages.items(), key=lambda item: -item[1][2]):
+            lines.append(f"{name:<20} {calls:>8} {total:>9.3f} {own:>9.3f} {peak / 1e6:>9.2f}")
+        if self.pages:
+            lines.append("")
+            lines.append(f"Slowest {min(top, len(self.pages))} of {len(self.pages)} pages       seconds   peak MB")
+            slowest = sorted(self.pages.items(), key=lambda item: -item[1][0])[:top]
+            for name, (elapsed, peak) in slowest:
+                lines.append(f"{name[-32:]:<32} {elapsed:>9.4f} {peak / 1e6:>9.2f}")
+        if self.dump_path:
+            lines.append("")
+            lines.append(f"cProfile stats written to {self.dump_path} (python3 -m pstats {self.dump_path})")
+        return "\n".join(lines)
+
+
+def is_active():
+    return _active is not None
+
+
+def stage(name):
+    if _active is None:
+        return _NO_OP
+    return _active.measure(name)
+
+
+def page(name):
+    if _active is None:
+        return _NO_OP
+    return _active.measure(name, is_page=True)
+
+
+def timed_iter(name, iterable):
+    # Times only the work of producing each item, e.g. the directory reads
+    # behind os.walk, not what the loop body does with it
+    if _active is None:
+        return iterable
+    return _timed_iter(name, iter(iterable))
+
+
+def _timed_iter(name, iterator):
+    while True:
+        with _active.measure(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
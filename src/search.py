@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import shutil
+
+from output import AtomicFile, ChangeSet
+
+# The index lives in docs/search: docs.json maps document ids to (url, title)
+# and index/<prefix>.json holds the postings of every term starting with that
+# prefix, so a query only downloads the shards of its own terms
+SEARCH_DIR = "search"
+SHARD_DIR = "index"
+DOCS_NAME = "docs.json"
+SCRIPT_NAME = "search.js"
+# Per-page terms from earlier builds, so only changed pages are re-tokenized
+STORE_NAME = ".terms.json"
+STORE_VERSION = 1
+PREFIX_LENGTH = 2
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    "an and are as at be but by for from has have he in is it its of on or "
+    "that the their there they this to was were which will with".split()
+)
+
+# Loaded with <script src=".../search/search.js">; exposes search(query),
+# resolving to [{url, title, score}] best first. Queries are tokenized like
+# tokenize(): the same stop words and minimum length, so no query term is
+# looked up that the index could never hold.
+SEARCH_SCRIPT = """(function () {
+  var base = document.currentScript.src.replace(/[^/]*$/, "");
+  var stopWords = %(stop_words)s;
+  var cache = {};
+  function load(path) {
+    if (!cache[path]) {
+      cache[path] = fetch(base + path).then(function (r) { return r.ok ? r.json() : {}; });
+    }
+    return cache[path];
+  }
+  window.search = function (query) {
+    var terms = (query.toLowerCase().match(/[\\p{L}\\p{N}_]+/gu) || []).filter(function (term) {
+      return term.length >= %(prefix)d && !Object.prototype.hasOwnProperty.call(stopWords, term);
+    });
+    if (!terms.length) {
+      return Promise.resolve([]);
+    }
+    var shards = terms.map(function (term) {
+      return load("%(shards)s/" + encodeURIComponent(term.slice(0, %(prefix)d)) + ".json");
+    });
+    return Promise.all([load("%(docs)s")].concat(shards)).then(function (loaded) {
+      var docs = loaded[0], scores = null;
+      terms.forEach(function (term, i) {
+        var next = {};
+        (loaded[i + 1][term] || []).forEach(function (posting) {
+          if (scores === null || posting[0] in scores) {
+            next[posting[0]] = (scores === null ? 0 : scores[posting[0]]) + posting[1];
+          }
+        });
+        scores = next;
+      });
+      return Object.keys(scores).map(function (id) {
+        return {url: docs[id][0], title: docs[id][1], score: scores[id]};
+      }).sort(function (a, b) { return b.score - a.score; });
+    });
+  };
+})();
+""" % {
+    "prefix": PREFIX_LENGTH,
+    "shards": SHARD_DIR,
+    "docs": DOCS_NAME,
+    "stop_words": json.dumps(dict.fromkeys(sorted(STOP_WORDS), 1), separators=(",", ":")),
+}
+
+
+def tokenize(text):
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        if len(term) >= PREFIX_LENGTH and term not in STOP_WORDS:
+            yield term
+
+
+def add_terms(node, counts):
+    # Counts the words of an HTMLNode tree (text and image alt text)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.value is not None:
+            counts.update(tokenize(node.value))
+        alt = node.props.get("alt")
+        if alt:
+            counts.update(tokenize(alt))
+        stack.extend(node.children)
+    return counts
+
+
+def page_url(rel_output, basepath):
+    url = basepath + rel_output.replace(os.sep, "/")
+    if url.endswith("/index.html"):
+        return url[:-len("index.html")]
+    return url
+
+
+class SearchIndex:
+    def __init__(self, public_dir, store, fresh=False):
+        self.search_dir = os.path.join(public_dir, SEARCH_DIR)
+        self.public_dir = public_dir
+        self.store = store
+        # Without a store, shards left on disk can't be trusted to be complete
+        self.fresh = fresh
+
+    @classmethod
+    def load(cls, public_dir):
+        path = os.path.join(public_dir, SEARCH_DIR, STORE_NAME)
+        try:
+            with open(path, "r") as file:
+                store = json.load(file)
+        except (OSError, ValueError):
+            store = None
+        if not isinstance(store, dict) or store.get("version") != STORE_VERSION:
+            store = {"version": STORE_VERSION, "basepath": None, "next_id": 0, "pages": {}}
+            return cls(public_dir, store, fresh=True)
+        return cls(public_dir, store)
+
+    def has(self, rel_output):
+        return rel_output in self.store["pages"]
+
+    def update(self, documents, outputs, basepath, changes=None):
+        # documents maps freshly rendered output paths to (title, term counts);
+        # outputs is every output that is still part of the site. Only the
+        # shards holding terms of added, changed or removed pages are rewritten.
+        changes = ChangeSet() if changes is None else changes
+        pages = self.store["pages"]
+        dirty = set()
+        # Whether the store itself needs writing back
+        changed = self.fresh or self.store["basepath"] != basepath
+
+        # Sorted, so new pages get the same ids however the pages were
+        # scheduled (worker processes finish in any order)
+        for html_path, (title, terms) in sorted(documents.items()):
+            rel_output = os.path.relpath(html_path, self.public_dir)
+            old = pages.get(rel_output)
+            if old is not None:
+                if old["title"] == title and old["terms"] == terms:
+                    continue
+                dirty.update(term[:PREFIX_LENGTH] for term in old["terms"])
+                doc_id = old["id"]
+            else:
+                doc_id = self.store["next_id"]
+                self.store["next_id"] += 1
+            pages[rel_output] = {"id": doc_id, "title": title, "terms": dict(terms)}
+            dirty.update(term[:PREFIX_LENGTH] for term in terms)
+            changed = True
+
+        for rel_output in [rel for rel in pages if rel not in outputs]:
+            dirty.update(term[:PREFIX_LENGTH] for term in pages.pop(rel_output)["terms"])
+            changed = True
+        self.store["basepath"] = basepath
+
+        shards = {prefix: {} for prefix in dirty}
+        if dirty:
+            # In id order, so a shard's bytes only depend on what it indexes
+            for page in sorted(pages.values(), key=lambda page: page["id"]):
+                for term, count in page["terms"].items():
+                    shard = shards.get(term[:PREFIX_LENGTH])
+                    if shard is not None:
+                        shard.setdefault(term, []).append([page["id"], count])
+
+        shard_dir = os.path.join(self.search_dir, SHARD_DIR)
+        if self.fresh:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+            self.fresh = False
+        os.makedirs(shard_dir, exist_ok=True)
+        for prefix, shard in shards.items():
+            path = os.path.join(shard_dir, prefix + ".json")
+            if shard:
+                self._write(path, shard, changes)
+            elif os.path.exists(path):
+                os.remove(path)
+                changes.record_removed(path)
+
+        docs = {page["id"]: [page_url(rel, basepath), page["title"]] for rel, page in pages.items()}
+        self._write(os.path.join(self.search_dir, DOCS_NAME), docs, changes)
+        self._write_text(os.path.join(self.search_dir, SCRIPT_NAME), SEARCH_SCRIPT, changes)
+        if changed:
+            self._write_text(os.path.join(self.search_dir, STORE_NAME), json.dumps(self.store), changes=None)
+        print(f"Search: {len(pages)} pages, {len(shards)} shards updated")
+        return len(shards)
+
+    def _write(self, path, data, changes):
+        # Compact and key-sorted, so an unchanged shard is byte-identical
+        self._write_text(path, json.dumps(data, separators=(",", ":"), sort_keys=True), changes)
+
+    def _write_text(self, path, text, changes):
+        output = AtomicFile(path)
+        with output as file:
+            file.write(text)
+        if changes is not None:
+            changes.record(path, output.status)
@@ -0,0 +1,460 @@
+import argparse
+import email.utils
+import functools
+import hashlib
+import io
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from builder import CONTENT_DIR, STATIC_DIR, TEMPLATE_NAME, page_output_path
+from frontmatter import page_template, read_front_matter
+from images import ImageIndex, is_image, probe_image
+from blockcache import BlockCache
+from main import (
+    PROJECT_ROOT,
+    BuildState,
+    build,
+    rebuild_paths,
+)
+from manifest import HashCache, hash_file
+from markdown_blocks import write_page
+from template import load_template
+
+# How often the watcher looks for changes; keeps edit-to-reload well under 100 ms
+POLL_INTERVAL = 0.05
+# Rendered pages kept by the on-demand server, in bytes of HTML
+CACHE_BYTES = 64 * 1024 * 1024
+RELOAD_PATH = "/__livereload"
+RELOAD_SCRIPT = (
+    "<script>new EventSource(\"" + RELOAD_PATH + "\")"
+    ".onmessage = function () { location.reload(); };</script>"
+).encode()
+
+
+class ReloadBroadcaster:
+    # Every rebuild bumps the version; open event streams wait for it to move
+    def __init__(self):
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def notify(self):
+        with self._changed:
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait(self, version, timeout):
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            return self.send_events()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split("?", 1)[0].endswith("/"):
+            path = os.path.join(path, "index.html")
+        if self.server.reloads is not None and path.endswith(".html") and os.path.isfile(path):
+            return self.send_page(path)
+        return super().do_GET()
+
+    def send_page(self, path):
+        # The reload script is only added to what the browser sees, never to docs/
+        with open(path, "rb") as file:
+            html = file.read()
+        index = html.rfind(b"</body>")
+        if index == -1:
+            html += RELOAD_SCRIPT
+        else:
+            html = html[:index] + RELOAD_SCRIPT + html[index:]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(html)
+
+    def send_events(self):
+        reloads = self.server.reloads
+        if reloads is None:
+            return self.send_error(404)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        version = reloads.version
+        try:
+            while True:
+                latest = reloads.wait(version, timeout=15)
+                if latest == version:
+                    # Keep-alive comment, also notices browsers that went away
+                    self.wfile.write(b": ping\n\n")
+                else:
+                    version = latest
+                    self.wfile.write(b"data: reload\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class PageCache:
+    # Rendered pages by markdown path, least recently used dropped first once
+    # the HTML held goes over max_bytes
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            return page
+
+    def put(self, key, page):
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self.size -= len(old.body)
+            if len(page.body) > self.max_bytes:
+                return
+            self._pages[key] = page
+            self.size += len(page.body)
+            while self.size > self.max_bytes:
+                _, dropped = self._pages.popitem(last=False)
+                self.size -= len(dropped.body)
+
+    def __len__(self):
+        return len(self._pages)
+
+
+class RenderedPage:
+    __slots__ = ("stamp", "source_hash", "template_digest", "images", "body", "etag", "last_modified")
+
+    def __init__(self, stamp, source_hash, template_digest, images, body, last_modified):
+        # images is ImageIndex.sizes_in for the page, what its img tags show
+        self.stamp = stamp
+        self.source_hash = source_hash
+        self.template_digest = template_digest
+        self.images = images
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.last_modified = last_modified
+
+
+class Previewer:
+    # Renders pages straight from content/ when they are asked for, without a
+    # build; URLs map to markdown files the same way the build names outputs
+    def __init__(self, project_root, basepath="/", cache=None, minify=False):
+        self.content_dir = os.path.join(project_root, CONTENT_DIR)
+        self.static_dir = os.path.join(project_root, STATIC_DIR)
+        self.template_path = os.path.join(project_root, TEMPLATE_NAME)
+        self.basepath = basepath
+        self.cache = PageCache() if cache is None else cache
+        self.minify = minify
+        self.renders = 0
+        # (stamps of the images in static/, their ImageIndex)
+        self._images = (None, ImageIndex())
+
+    def source_for(self, url_path):
+        # URL path -> markdown path, or None when no page lives there
+        path = urllib.parse.unquote(url_path.split("?", 1)[0])
+        if not path.startswith(self.basepath):
+            return None
+        rel_path = path[len(self.basepath):].lstrip("/")
+        if rel_path == "" or rel_path.endswith("/"):
+            rel_path += "index.html"
+        if not rel_path.endswith(".html"):
+            return None
+        output = os.path.normpath(rel_path)
+        if output.startswith(".."):
+            return None
+        md_rel = output[:-len(".html")] + ".md"
+        # Same naming rule as the build, so a preview URL is the deployed URL
+        if page_output_path(md_rel) != output:
+            return None
+        md_path = os.path.join(self.content_dir, md_rel)
+        return md_path if os.path.isfile(md_path) else None
+
+    def images(self):
+        # Sizes of the images in static/, probed again only once one of them
+        # changes; the build gets the same from the static sync
+        stamps = {}
+        for root, _, files in os.walk(self.static_dir):
+            for file in files:
+                if not is_image(file):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                stamps[os.path.relpath(path, self.static_dir)] = (stat.st_mtime_ns, stat.st_size)
+        known, images = self._images
+        if stamps != known:
+            sizes = {}
+            for rel_path in stamps:
+                size = probe_image(os.path.join(self.static_dir, rel_path))
+                if size:
+                    sizes[rel_path.replace(os.sep, "/")] = size
+            images = ImageIndex(sizes)
+            self._images = (stamps, images)
+        return images
+
+    def page(self, md_path):
+        # The cached page while its source, the template and the sizes of
+        # its images are unchanged. Drafts are previewed like any other page.
+        template = load_template(page_template(read_front_matter(md_path), self.template_path))
+        images = self.images()
+        stat = os.stat(md_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.cache.get(md_path)
+        if (
+            cached is not None
+            and cached.template_digest == template.digest
+            and images.unchanged(cached.images, self.basepath)
+        ):
+            if cached.stamp == stamp:
+                return cached
+            # Touched but maybe not edited: only the content can tell
+            if cached.source_hash == hash_file(md_path):
+                cached.stamp = stamp
+                return cached
+
+        source_hash = hash_file(md_path)
+        with open(md_path, "r") as file:
+            markdown = file.read()
+        out = io.StringIO()
+        write_page(markdown, template, out, self.basepath, images=images, minify=self.minify)
+        newest = max([stat.st_mtime_ns] + [mtime for mtime, _ in template.dependencies.values()])
+        page = RenderedPage(
+            stamp, source_hash, template.digest, images.sizes_in(markdown, self.basepath),
+            out.getvalue().encode(), newest // 10**9,
+        )
+        self.cache.put(md_path, page)
+        self.renders += 1
+        return page
+
+
+class PreviewRequestHandler(SimpleHTTPRequestHandler):
+    # Pages come from the Previewer, anything else from static/
+    def do_GET(self):
+        self.send_preview(head=False)
+
+    def do_HEAD(self):
+        self.send_preview(head=True)
+
+    def send_preview(self, head):
+        previewer = self.server.previewer
+        md_path = previewer.source_for(self.path)
+        if md_path is None:
+            path = self.path.split("?", 1)[0]
+            if not path.endswith("/") and previewer.source_for(path + "/") is not None:
+                # Directory URL without its slash, as a static server would
+                self.send_response(301)
+                self.send_header("Location", path + "/")
+                self.end_headers()
+                return
+            return super().do_HEAD() if head else super().do_GET()
+        try:
+            page = previewer.page(md_path)
+        except Exception as e:
+            return self.send_error(500, f"{type(e).__name__}: {e}")
+
+        if self.is_not_modified(page):
+            self.send_response(304)
+            self.send_header("ETag", page.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page.body)))
+        self.send_header("ETag", page.etag)
+        self.send_header("Last-Modified", email.utils.formatdate(page.last_modified, usegmt=True))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not head:
+            self.wfile.write(page.body)
+
+    def translate_path(self, path):
+        # Static files are looked up without the basepath
+        basepath = self.server.previewer.basepath
+        if path.startswith(basepath):
+            path = "/" + path[len(basepath):]
+        return super().translate_path(path)
+
+    def is_not_modified(self, page):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return page.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return page.last_modified <= since
+        return False
+
+
+class Watcher:
+    # Rebuilds with rendered blocks, content hashes and the BuildState kept in
+    # memory from one rebuild to the next, as the build daemon does; the
+    # block cache is only written out on close
+    def __init__(self, project_root, basepath, reloads, interval=POLL_INTERVAL, minify=False):
+        self.project_root = project_root
+        self.content_dir = os.path.join(project_root, "content")
+        self.static_dir = os.path.join(project_root, "static")
+        self.template_path = os.path.join(project_root, "template.html")
+        self.basepath = basepath
+        self.reloads = reloads
+        self.interval = interval
+        self.minify = minify
+        self.stopped = threading.Event()
+        self.blocks = BlockCache.load(project_root)
+        self.hashes = HashCache()
+        self.state = BuildState(os.path.join(project_root, "docs"))
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        self.stop()
+        self.blocks.save()
+
+    def build(self):
+        # The first full build, which warms both caches
+        self.blocks.start_build()
+        try:
+            return build(
+                self.project_root, self.basepath, minify=self.minify, blocks=self.blocks, hashes=self.hashes,
+                state=self.state,
+            )
+        finally:
+            self.blocks.trim()
+
+    def snapshot(self):
+        # path -> (mtime_ns, size) for every input of the build
+        stamps = {}
+        for directory in (self.content_dir, self.static_dir):
+            for root, _, files in os.walk(directory):
+                for file in files:
+                    path = os.path.join(root, file)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        try:
+            stamps.update(load_template(self.template_path).dependencies)
+        except (OSError, ValueError):
+            stamps[self.template_path] = None
+        return stamps
+
+    def rebuild(self, changed):
+        started = time.perf_counter()
+        self.blocks.start_build()
+        if not self.state.is_current():
+            self.state = BuildState(self.state.public_dir)
+        try:
+            rebuild_paths(
+                self.project_root, self.basepath, changed, blocks=self.blocks, hashes=self.hashes, minify=self.minify,
+                state=self.state,
+            )
+        except Exception:
+            # It may have been left half updated; start over from disk
+            self.state = BuildState(self.state.public_dir)
+            raise
+        finally:
+            self.blocks.trim()
+        self.reloads.notify()
+        print(f"Rebuilt {len(changed)} changed file(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def run(self):
+        previous = self.snapshot()
+        while not self.stopped.wait(self.interval):
+            current = self.snapshot()
+            if current == previous:
+                continue
+            changed = {path for path in previous.keys() | current.keys() if previous.get(path) != current.get(path)}
+            previous = current
+            try:
+                self.rebuild(changed)
+            except Exception as e:
+                # A broken edit shouldn't kill the server; the next save retries
+                print(f"Rebuild failed: {type(e).__name__}: {e}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Build docs/ and serve it locally.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--watch", action="store_true", help="rebuild on changes and live-reload the browser")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between change polls")
+    parser.add_argument("--minify", action="store_true", help="strip comments and layout whitespace from pages")
+    parser.add_argument(
+        "--on-demand", action="store_true",
+        help="don't build; render each page from content/ when it is requested",
+    )
+    parser.add_argument(
+        "--cache-mb", type=float, default=CACHE_BYTES / (1024 * 1024),
+        help="HTML kept in memory by --on-demand, in MiB",
+    )
+    args = parser.parse_args(argv)
+    if args.on_demand and args.watch:
+        parser.error("--on-demand always serves the current content; drop --watch")
+    return args
+
+
+def serve(argv, project_root=PROJECT_ROOT):
+    args = parse_args(argv)
+    if args.on_demand:
+        return serve_on_demand(args, project_root)
+    watcher = None
+    reloads = None
+    if args.watch:
+        reloads = ReloadBroadcaster()
+        watcher = Watcher(project_root, args.basepath, reloads, args.interval, args.minify)
+        watcher.build()
+    else:
+        build(project_root, args.basepath, minify=args.minify)
+
+    handler = functools.partial(DevRequestHandler, directory=os.path.join(project_root, "docs"))
+    server = ThreadingHTTPServer(("", args.port), handler)
+    server.daemon_threads = True
+    server.reloads = reloads
+    if watcher is not None:
+        threading.Thread(target=watcher.run, daemon=True).start()
+
+    print(f"Serving docs/ on http://localhost:{args.port}/" + (" (watching for changes)" if args.watch else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if watcher is not None:
+            watcher.close()
+
+
+def serve_on_demand(args, project_root):
+    handler = functools.partial(PreviewRequestHandler, directory=os.path.join(project_root, STATIC_DIR))
+    server = ThreadingHTTPServer(("", args.port), handler)
+    server.daemon_threads = True
+    cache = PageCache(int(args.cache_mb * 1024 * 1024))
+    server.previewer = Previewer(project_root, args.basepath, cache, args.minify)
+
+    print(f"Rendering content/ on demand on http://localhost:{args.port}{args.basepath}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
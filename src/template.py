@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+
+# {{ Name }} is a slot filled in per page, {{> name }} includes another
+# template file (a partial) at compile time.
+TAG_PATTERN = re.compile(r"\{\{\s*(>)?\s*([\w./-]+)\s*\}\}")
+
+# path -> Template, reused for as long as none of its files change on disk
+_cache = {}
+
+
+class Template:
+    def __init__(self, path, segments, dependencies, digest):
+        self.path = path
+        # list of (is_slot, text); for slots, text is the slot name
+        self.segments = segments
+        # path -> (mtime_ns, size) for the template and every partial it pulled in
+        self.dependencies = dependencies
+        # hash over the source of the template and its partials
+        self.digest = digest
+        self._rewritten = {}
+
+    def is_current(self):
+        for path, stamp in self.dependencies.items():
+            try:
+                if _stamp(path) != stamp:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def segments_for(self, basepath):
+        # Root-relative URLs in the template itself only need the basepath
+        # applied once, not on every page render
+        if basepath not in self._rewritten:
+            self._rewritten[basepath] = [
+                (is_slot, text if is_slot else apply_basepath(text, basepath))
+                for is_slot, text in self.segments
+            ]
+        return self._rewritten[basepath]
+
+    def render(self, out, values, basepath="/"):
+        # A value is either a string or a callable that writes itself to out,
+        # which lets large slot contents be streamed instead of built up front
+        for is_slot, text in self.segments_for(basepath):
+            if not is_slot:
+                out.write(text)
+            elif text in values:
+                value = values[text]
+                if callable(value):
+                    value(out)
+                else:
+                    out.write(value)
+            else:
+                # Unknown slots are left in the page untouched
+                out.write(f"{{{{ {text} }}}}")
+
+    def render_to_string(self, values, basepath="/"):
+        parts = []
+        self.render(_ListWriter(parts), values, basepath)
+        return "".join(parts)
+
+
+class _ListWriter:
+    def __init__(self, parts):
+        self.write = parts.append
+
+
+def apply_basepath(html, basepath):
+    # Only used on the template's own markup, once per compiled template;
+    # page content gets the basepath while its nodes are built
+    if basepath == "/":
+        return html
+    html = html.replace('href="/', f'href="{basepath}')
+    return html.replace('src="/', f'src="{basepath}')
+
+
+def load_template(path):
+    path = os.path.abspath(path)
+    template = _cache.get(path)
+    if template is None or not template.is_current():
+        template = compile_template(path)
+        _cache[path] = template
+    return template
+
+
+def compile_template(path, read=None):
+    # read(path) -> text, when given, supplies the template and its partials
+    # instead of the disk (an in-memory build); nothing is stamped then
+    dependencies = {}
+    digest = hashlib.sha256()
+    path = os.path.abspath(path) if read is None else os.path.normpath(path)
+    segments = _compile_file(path, dependencies, digest, (), read)
+    return Template(path, _merge_literals(segments), dependencies, digest.hexdigest())
+
+
+def _compile_file(path, dependencies, digest, including, read=None):
+    if path in including:
+        chain = " -> ".join(including + (path,))
+        raise ValueError(f"template partials include themselves: {chain}")
+    if read is None:
+        dependencies[path] = _stamp(path)
+        with open(path, "r") as file:
+            source = file.read()
+    else:
+        source = read(path)
+    digest.update(source.encode())
+
+    segments = []
+    position = 0
+    for match in TAG_PATTERN.finditer(source):
+        segments.append((False, source[position:match.start()]))
+        is_partial, name = match.groups()
+        if is_partial:
+            partial_path = _partial_path(path, name)
+            segments.extend(_compile_file(partial_path, dependencies, digest, including + (path,), read))
+        else:
+            segments.append((True, name))
+        position = match.end()
+    segments.append((False, source[position:]))
+    return segments
+
+
+def _partial_path(including_path, name):
+    # Partials are looked up next to the file that includes them
+    if not os.path.splitext(name)[1]:
+        name += ".html"
+    return os.path.join(os.path.dirname(including_path), name)
+
+
+def _merge_literals(segments):
+    merged = []
+    for is_slot, text in segments:
+        if not is_slot and merged and not merged[-1][0]:
+            merged[-1] = (False, merged[-1][1] + text)
+        elif is_slot or text:
+            merged.append((is_slot, text))
+    return merged
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
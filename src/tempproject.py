@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+
+
+class TempProject:
+    # Mixin for the TestCase classes that build a throwaway project: call
+    # make_project() in setUp. self.root gets content/, static/ and whatever
+    # files are passed, and docs/ once the test builds it; it is removed
+    # after the test.
+    def make_project(self, files=None, dirs=("content", "static")):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for directory in dirs:
+            os.makedirs(os.path.join(self.root, directory), exist_ok=True)
+        for rel_path, text in (files or {}).items():
+            self.write(rel_path, text)
+        return self.root
+
+    def write(self, rel_path, text):
+        # rel_path is relative to the project root; text may be bytes
+        path = os.path.join(self.root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(text, bytes) else "w") as file:
+            file.write(text)
+
+    def output(self, rel_path):
+        return os.path.join(self.root, "docs", rel_path)
+
+    def read(self, rel_path):
+        # A built output, relative to docs/
+        with open(self.output(rel_path)) as file:
+            return file.read()
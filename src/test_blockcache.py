@@ -0,0 +1,100 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from blockcache import BLOCK_CACHE_NAME, BlockCache, block_key
+from main import build
+from markdown_blocks import parse_blocks
+from tempproject import TempProject
+
+
+class TestBlockCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_key_depends_on_text_and_basepath(self):
+        first, second = parse_blocks(["Some [link](/x)", "", "Other"])
+        self.assertNotEqual(block_key(first, "/"), block_key(second, "/"))
+        self.assertNotEqual(block_key(first, "/"), block_key(first, "/base/"))
+        self.assertEqual(block_key(first, "/"), block_key(next(parse_blocks(["Some [link](/x)  "])), "/"))
+        self.assertNotEqual(block_key(first, "/"), block_key(first, "/", "images-digest"))
+
+    def test_worker_results_are_absorbed(self):
+        cache = BlockCache.load(self.cache_dir)
+        worker = BlockCache.load(self.cache_dir)
+        self.assertIsNone(worker.get("a"))
+        worker.put("a", "<p>a</p>", {"a": 1})
+        cache.absorb(worker.drain())
+        self.assertEqual(cache.get("a")[0], "<p>a</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual((worker.hits, worker.misses), (0, 0))
+
+    def test_save_keeps_recently_used_blocks(self):
+        cache = BlockCache.load(self.cache_dir, max_bytes=200)
+        cache.put("old", "x" * 60, {})
+        cache.save()
+
+        cache = BlockCache.load(self.cache_dir, max_bytes=200)
+        cache.put("new", "y" * 60, {})
+        cache.save()
+        self.assertEqual(set(BlockCache.load(self.cache_dir).entries), {"new"})
+
+    def test_disabled_cache_is_not_saved(self):
+        cache = BlockCache.load(self.cache_dir, max_bytes=0)
+        cache.put("a", "<p>a</p>", {})
+        cache.save()
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, BLOCK_CACHE_NAME)))
+
+
+class TestBuildWithBlockCache(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({"template.html": "<title>{{ Title }}</title>{{ Content }}"})
+        self.paragraphs = [f"Paragraph {n} with **bold** and a [link](/p{n})" for n in range(10)]
+        self.write_page()
+
+    def write_page(self):
+        self.write("content/index.md", "# Long page\n\n" + "\n\n".join(self.paragraphs))
+
+    def build(self, *args):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            build(self.root, *args)
+        return out.getvalue()
+
+    def read_page(self):
+        return self.read("index.html")
+
+    def test_editing_one_paragraph_renders_one_block(self):
+        self.assertIn("Blocks: 0 reused, 11 rendered", self.build())
+        self.paragraphs[4] = "Paragraph four, _edited_"
+        self.write_page()
+        self.assertIn("Blocks: 10 reused, 1 rendered", self.build())
+        self.assertIn("<p>Paragraph four, <i>edited</i></p>", self.read_page())
+
+    def test_cache_is_kept_out_of_docs(self):
+        self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.root, BLOCK_CACHE_NAME)))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "docs", BLOCK_CACHE_NAME)))
+
+    def test_cached_output_matches_fresh_output(self):
+        self.build("/base/")
+        first = self.read_page()
+        os.remove(os.path.join(self.root, "docs", "index.html"))
+        self.assertIn("Blocks: 11 reused, 0 rendered", self.build("/base/"))
+        self.assertEqual(self.read_page(), first)
+
+        shutil.rmtree(os.path.join(self.root, "docs"))
+        os.remove(os.path.join(self.root, BLOCK_CACHE_NAME))
+        self.build("/base/", 1, True, 0)
+        self.assertEqual(self.read_page(), first)
+        self.assertFalse(os.path.exists(os.path.join(self.root, BLOCK_CACHE_NAME)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from builder import (
+    CallbackSink,
+    DictSink,
+    DictSource,
+    DirectorySink,
+    DirectorySource,
+    build_site,
+)
+from main import build
+
+FILES = {
+    "template.html": '<html><head><title>{{ Title }}</title>{{> head }}</head><body>{{ Content }}</body></html>',
+    "head.html": '<link href="/index.css" rel="stylesheet">',
+    "content/index.md": "# Home\n\nSee [the post](/blog/post)\n\n![a](/images/a.png)",
+    "content/blog/post.md": "# Post\n\n- one\n- two",
+    "content/broken.md": "no title here",
+    "static/index.css": "body {}",
+    "static/images/a.png": b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 64, 48),
+}
+
+
+class TestBuildSite(unittest.TestCase):
+    def test_builds_in_memory(self):
+        sink = DictSink()
+        failed = build_site(DictSource(FILES), sink, "/site/")
+        self.assertEqual(failed, [("content/broken.md", "Exception: No h1 header found in Markdown file.")])
+        self.assertEqual(
+            sorted(sink.files),
+            ["blog/post.html", "images/a.png", "index.css", "index.html"],
+        )
+        self.assertEqual(
+            sink.files["index.html"],
+            '<html><head><title>Home</title><link href="/site/index.css" rel="stylesheet"></head>'
+            '<body><div><h1>Home</h1><p>See <a href="/site/blog/post">the post</a></p>'
+            '<p><img src="/site/images/a.png" alt="a" width="64" height="48" loading="lazy"></img></p>'
+            '</div></body></html>',
+        )
+        self.assertEqual(sink.files["images/a.png"], FILES["static/images/a.png"])
+
+    def test_callback_sink(self):
+        written = []
+        build_site(DictSource(FILES), CallbackSink(lambda path, data: written.append(path)))
+        self.assertEqual(len(written), 4)
+
+    def test_matches_disk_build(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        project = os.path.join(root, "project")
+        project_sink = DirectorySink(project)
+        for path, data in FILES.items():
+            project_sink.write(path, data)
+        for minify in (False, True):
+            build(project, "/site/", minify=minify)
+
+            sink = DictSink()
+            build_site(DirectorySource(project), sink, "/site/", minify=minify)
+            self.assertIn('width="64" height="48" loading="lazy"', sink.files["index.html"])
+            for path, data in sink.files.items():
+                mode = "rb" if isinstance(data, bytes) else "r"
+                with open(os.path.join(project, "docs", path), mode) as file:
+                    self.assertEqual(file.read(), data, (path, minify))
+
+    def test_front_matter(self):
+        files = dict(FILES)
+        files["content/draft.md"] = "---\ndraft: true\n---\n# Draft"
+        files["content/note.md"] = "---\ntitle: Note\ntemplate: note.html\n---\nShort"
+        files["note.html"] = "<aside>{{ Title }}: {{ Content }}</aside>"
+        sink = DictSink()
+        build_site(DictSource(files), sink)
+        self.assertNotIn("draft.html", sink.files)
+        self.assertEqual(sink.files["note.html"], "<aside>Note: <div><p>Short</p></div></aside>")
+        build_site(DictSource(files), sink, drafts=True)
+        self.assertIn("draft.html", sink.files)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            build_site(DictSource({"content/index.md": "# Hi"}), DictSink())
+
+
+if __name__ == "__main__":
+    unittest.main()
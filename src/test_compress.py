@@ -0,0 +1,91 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from compress import MIN_SIZE, compress_outputs
+from output import CHANGED, ChangeSet
+
+
+class TestCompressOutputs(unittest.TestCase):
+    def setUp(self):
+        self.public_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.public_dir, "blog"))
+        self.write("index.html", "<p>hello</p>" * 200)
+        self.write("blog/index.html", "<p>post</p>" * 200)
+        self.write("small.css", "body {}")
+        self.write("photo.png", "x" * (MIN_SIZE * 2))
+        # Random bytes don't compress
+        with open(os.path.join(self.public_dir, "noise.js"), "wb") as file:
+            file.write(os.urandom(MIN_SIZE * 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.public_dir)
+
+    def write(self, rel_path, text):
+        with open(os.path.join(self.public_dir, rel_path), "w") as file:
+            file.write(text)
+
+    def path(self, rel_path):
+        return os.path.join(self.public_dir, rel_path)
+
+    def test_sidecars_are_written_for_compressible_outputs(self):
+        counts = compress_outputs(self.public_dir)
+        self.assertEqual(counts["written"], 2)
+        self.assertEqual(counts["skipped"], 1)
+        with gzip.open(self.path("blog/index.html.gz"), "rt") as file:
+            self.assertEqual(file.read(), "<p>post</p>" * 200)
+        for rel_path in ("small.css.gz", "photo.png.gz", "noise.js.gz"):
+            self.assertFalse(os.path.exists(self.path(rel_path)))
+
+    def test_unchanged_outputs_reuse_their_sidecars(self):
+        compress_outputs(self.public_dir)
+        os.utime(self.path("index.html.gz"), ns=(1, 1))
+        self.write("blog/index.html", "<p>edited</p>" * 200)
+        counts = compress_outputs(self.public_dir)
+        self.assertEqual(counts["written"], 1)
+        self.assertEqual(counts["reused"], 1)
+        self.assertEqual(os.stat(self.path("index.html.gz")).st_mtime_ns, 1)
+        with gzip.open(self.path("blog/index.html.gz"), "rt") as file:
+            self.assertEqual(file.read(), "<p>edited</p>" * 200)
+
+    def test_only_changed_outputs_are_read(self):
+        for rel_path in ("index.html", "blog/index.html", "noise.js"):
+            os.utime(self.path(rel_path), ns=(10**18, 10**18))
+        compress_outputs(self.public_dir)
+        # Same stamp and not in the change set: not even hashed
+        with mock.patch("compress.hash_file") as hash_file:
+            counts = compress_outputs(self.public_dir)
+        hash_file.assert_not_called()
+        self.assertEqual(counts["reused"], 2)
+        # Rewritten by the build with the same stamp: the change set says so
+        self.write("index.html", "<p>HELLO</p>" * 200)
+        os.utime(self.path("index.html"), ns=(10**18, 10**18))
+        changes = ChangeSet()
+        changes.record(self.path("index.html"), CHANGED)
+        counts = compress_outputs(self.public_dir, changes)
+        self.assertEqual(counts["written"], 1)
+        with gzip.open(self.path("index.html.gz"), "rt") as file:
+            self.assertEqual(file.read(), "<p>HELLO</p>" * 200)
+
+    def test_sidecar_of_removed_output_is_removed(self):
+        compress_outputs(self.public_dir)
+        os.remove(self.path("blog/index.html"))
+        counts = compress_outputs(self.public_dir)
+        self.assertEqual(counts["removed"], 1)
+        self.assertFalse(os.path.exists(self.path("blog/index.html.gz")))
+
+    def test_output_is_deterministic(self):
+        compress_outputs(self.public_dir)
+        with open(self.path("index.html.gz"), "rb") as file:
+            first = file.read()
+        os.remove(self.path("index.html.gz"))
+        compress_outputs(self.public_dir)
+        with open(self.path("index.html.gz"), "rb") as file:
+            self.assertEqual(file.read(), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
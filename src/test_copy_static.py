@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import copy_static_files, prune_orphans
+
+
+class TestCopyStaticFiles(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.static_dir = os.path.join(self.root, "static")
+        self.public_dir = os.path.join(self.root, "docs")
+        os.makedirs(os.path.join(self.static_dir, "images"))
+        self.write(self.static_dir, "index.css", "body {}")
+        self.write(self.static_dir, "images/a.png", "png bytes")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, base, rel_path, text):
+        with open(os.path.join(base, rel_path), "w") as file:
+            file.write(text)
+
+    def test_first_sync_copies_everything(self):
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["copied"], [2, 16])
+        with open(os.path.join(self.public_dir, "images", "a.png")) as file:
+            self.assertEqual(file.read(), "png bytes")
+
+    def test_unchanged_files_are_skipped(self):
+        copy_static_files(self.static_dir, self.public_dir)
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["copied"], [0, 0])
+        self.assertEqual(counts["skipped"], [2, 16])
+
+    def test_touched_but_identical_file_is_skipped(self):
+        copy_static_files(self.static_dir, self.public_dir)
+        os.utime(os.path.join(self.static_dir, "index.css"), ns=(1, 1))
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["copied"], [0, 0])
+
+    def test_changed_file_is_copied(self):
+        copy_static_files(self.static_dir, self.public_dir)
+        self.write(self.static_dir, "index.css", "body {x}")
+        os.utime(os.path.join(self.static_dir, "index.css"), ns=(1, 1))
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["copied"], [1, 8])
+        with open(os.path.join(self.public_dir, "index.css")) as file:
+            self.assertEqual(file.read(), "body {x}")
+
+    def test_identical_images_are_stored_once(self):
+        self.write(self.static_dir, "images/b.png", "png bytes")
+        copy_static_files(self.static_dir, self.public_dir)
+        a_path = os.path.join(self.public_dir, "images", "a.png")
+        b_path = os.path.join(self.public_dir, "images", "b.png")
+        self.assertTrue(os.path.samefile(a_path, b_path))
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["skipped"], [3, 25])
+        self.assertTrue(os.path.samefile(a_path, b_path))
+
+    def test_removed_source_is_deleted_but_pages_are_kept(self):
+        copy_static_files(self.static_dir, self.public_dir)
+        self.write(self.public_dir, "index.html", "<p>generated</p>")
+        shutil.rmtree(os.path.join(self.static_dir, "images"))
+        counts = copy_static_files(self.static_dir, self.public_dir)
+        self.assertEqual(counts["deleted"], [1, 9])
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "images")))
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, "index.html")))
+
+
+    def test_deferred_orphans_survive_until_pruned(self):
+        copy_static_files(self.static_dir, self.public_dir)
+        os.remove(os.path.join(self.static_dir, "index.css"))
+        counts = copy_static_files(self.static_dir, self.public_dir, prune=False)
+        self.assertEqual(counts["deleted"], [0, 0])
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, "index.css")))
+        # Still an orphan for a later sync if this build never pruned
+        copy_static_files(self.static_dir, self.public_dir, prune=False)
+        self.assertEqual(prune_orphans(self.public_dir), [1, 7])
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "index.css")))
+        self.assertEqual(prune_orphans(self.public_dir), [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from corpus import CorpusSpec, generate_corpus
+from main import build
+
+
+class TestCorpus(unittest.TestCase):
+    def setUp(self):
+        self.roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+
+    def tearDown(self):
+        for root in self.roots:
+            shutil.rmtree(root)
+
+    def read_content(self, root):
+        pages = {}
+        content_dir = os.path.join(root, "content")
+        for dirpath, _, files in os.walk(content_dir):
+            for file in files:
+                with open(os.path.join(dirpath, file)) as f:
+                    pages[os.path.relpath(os.path.join(dirpath, file), content_dir)] = f.read()
+        return pages
+
+    def test_deterministic(self):
+        spec = CorpusSpec(pages=12, page_size=2000, pages_per_section=5, seed=7)
+        first = generate_corpus(self.roots[0], spec)
+        second = generate_corpus(self.roots[1], spec)
+        self.assertEqual(first, second)
+        self.assertEqual(self.read_content(self.roots[0]), self.read_content(self.roots[1]))
+        self.assertEqual(len(self.read_content(self.roots[0])), 12)
+        self.assertTrue(os.path.isdir(os.path.join(self.roots[0], "content", "section-002")))
+
+    def test_page_size_and_mix(self):
+        spec = CorpusSpec(pages=3, page_size=8000, list_share=0.3, quote_share=0.3, code_share=0.3)
+        total = generate_corpus(self.roots[0], spec)
+        self.assertGreaterEqual(total, 3 * 8000)
+        text = "".join(self.read_content(self.roots[0]).values())
+        for marker in ("\n- ", "\n1. ", "\n> ", "```", "](/"):
+            self.assertIn(marker, text)
+
+    def test_corpus_builds(self):
+        generate_corpus(self.roots[0], CorpusSpec(pages=5, seed=3))
+        self.assertEqual(build(self.roots[0]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
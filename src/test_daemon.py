@@ -0,0 +1,180 @@
+import io
+import json
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from client import send_request
+from daemon import BuildDaemon, DaemonRequestHandler, _claim_socket, serve_daemon
+from main import build
+from manifest import HashCache
+from tempproject import TempProject
+
+
+class TestBuildDaemon(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nFirst version",
+            "content/about.md": "# About\n\nUs",
+            "static/index.css": "body {}",
+            "template.html": "<html>{{ Content }}</html>",
+        })
+        self.daemon = BuildDaemon(self.root, gzip=False)
+
+    def test_build(self):
+        reply = self.daemon.handle({"command": "build"})
+        self.assertTrue(reply["ok"])
+        self.assertEqual(reply["failed"], [])
+        self.assertIn("Pages: 2 generated", reply["output"])
+        self.assertIn("First version", self.read("index.html"))
+
+        reply = self.daemon.handle({"command": "build"})
+        self.assertIn("Pages: 0 generated, 2 unchanged", reply["output"])
+
+    def test_build_path_renders_only_that_page(self):
+        self.daemon.handle({"command": "build"})
+        self.write("content/index.md", "# Home\n\nSecond version")
+        reply = self.daemon.handle({"command": "build-path", "paths": [os.path.join(self.root, "content/index.md")]})
+        self.assertTrue(reply["ok"])
+        self.assertIn("Second version", self.read("index.html"))
+        self.assertNotIn("about.md", reply["output"])
+
+    def test_build_path_saves_its_changes(self):
+        self.daemon.handle({"command": "build"})
+        self.write("content/index.md", "# Home\n\nSecond version")
+        reply = self.daemon.handle({"command": "build-path", "paths": [os.path.join(self.root, "content/index.md")]})
+        self.assertIn("Changes: ", reply["output"])
+        changes = json.loads(self.read(".changes.json"))
+        self.assertIn("index.html", changes["changed"])
+        self.assertNotIn("about.html", changes["added"] + changes["changed"])
+
+    def test_blocks_stay_in_memory(self):
+        self.daemon.handle({"command": "build"})
+        self.write("content/about.md", "# About\n\nUs\n\nAnd more")
+        self.daemon.handle({"command": "build"})
+        self.assertEqual(self.daemon.blocks.summary(), "2 reused, 1 rendered")
+        stats = self.daemon.handle({"command": "stats"})["stats"]
+        self.assertEqual(stats["requests"], {"build": 2})
+        self.assertEqual(stats["blocks"], 5)
+
+    def test_only_the_first_build_starts_workers(self):
+        daemon = BuildDaemon(self.root, jobs=2, gzip=False)
+        self.assertTrue(daemon.handle({"command": "build"})["ok"])
+        self.write("content/index.md", "# Home\n\nSecond version")
+        self.write("content/about.md", "# About\n\nThem")
+        with mock.patch("parallel.ProcessPoolExecutor", side_effect=AssertionError("pool started")), \
+                mock.patch("blockcache.BlockCache.load") as load:
+            reply = daemon.handle({"command": "build"})
+        self.assertTrue(reply["ok"], reply)
+        load.assert_not_called()
+        self.assertIn("Pages: 2 generated", reply["output"])
+        self.assertIn("Second version", self.read("index.html"))
+
+    def test_rebuild_reads_nothing_it_kept(self):
+        daemon = BuildDaemon(self.root)
+        self.write("content/about.md", "# About\n\n" + "Us and them. " * 200)
+        daemon.handle({"command": "build"})
+        self.write("content/about.md", "# About\n\n" + "Us and them, again. " * 200)
+        with mock.patch("main.load_manifest") as load_manifest, \
+                mock.patch("search.SearchIndex.load") as load_search, \
+                mock.patch("images.ImageIndex.load") as load_images, \
+                mock.patch("compress._compressible_files") as walk:
+            reply = daemon.handle({"command": "build-path", "paths": [os.path.join(self.root, "content/about.md")]})
+        self.assertTrue(reply["ok"], reply)
+        for loader in (load_manifest, load_search, load_images, walk):
+            loader.assert_not_called()
+        self.assertIn("Gzip: 1 written", reply["output"])
+        self.assertIn("again", self.read("about.html"))
+
+    def test_state_is_reloaded_after_an_outside_build(self):
+        self.daemon.handle({"command": "build"})
+        state = self.daemon.state
+        with mock.patch("sys.stdout", io.StringIO()):
+            build(self.root, gzip=False)
+        self.daemon.handle({"command": "build"})
+        self.assertIsNot(self.daemon.state, state)
+
+    def test_bad_requests(self):
+        self.assertFalse(self.daemon.handle({"command": "nope"})["ok"])
+        self.assertFalse(self.daemon.handle({"command": "build-path"})["ok"])
+        self.assertFalse(self.daemon.handle({"command": "stats"})["stats"]["requests"])
+
+    def test_stop(self):
+        self.assertTrue(self.daemon.handle({"command": "stop"})["ok"])
+        self.assertTrue(self.daemon.stopped)
+
+
+class TestDaemonSocket(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "daemon.sock")
+        self.daemon = mock.Mock()
+        self.daemon.handle.return_value = {"ok": True, "stats": {"requests": {}}}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def serve(self):
+        server = socketserver.UnixStreamServer(self.socket_path, DaemonRequestHandler)
+        server.build_daemon = self.daemon
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.handle_request, daemon=True)
+        thread.start()
+        return thread
+
+    def test_round_trip(self):
+        thread = self.serve()
+        reply = send_request(self.socket_path, {"command": "stats"}, timeout=5)
+        thread.join(5)
+        self.assertEqual(reply, {"ok": True, "stats": {"requests": {}}})
+        self.daemon.handle.assert_called_once_with({"command": "stats"})
+
+    def test_stale_socket_is_claimed(self):
+        server = socketserver.UnixStreamServer(self.socket_path, DaemonRequestHandler)
+        server.server_close()
+        self.assertTrue(os.path.exists(self.socket_path))
+        self.assertTrue(_claim_socket(self.socket_path))
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_live_socket_is_not_claimed(self):
+        thread = self.serve()
+        self.assertFalse(_claim_socket(self.socket_path))
+        thread.join(5)
+
+
+class TestServeDaemon(TempProject, unittest.TestCase):
+    def test_socket_is_created_owner_only(self):
+        root = self.make_project({"template.html": "{{ Content }}"})
+        umasks = []
+
+        def bind(*args):
+            umask = os.umask(0)
+            os.umask(umask)
+            umasks.append(umask)
+            raise OSError("not listening in this test")
+
+        with mock.patch("socketserver.UnixStreamServer", bind), mock.patch("sys.stdout", io.StringIO()):
+            with self.assertRaises(OSError):
+                serve_daemon(["--no-gzip"], project_root=root)
+        self.assertEqual(umasks, [0o077])
+
+
+class TestHashCache(unittest.TestCase):
+    def test_unchanged_file_is_not_read_again(self):
+        with tempfile.NamedTemporaryFile("w", delete=False) as file:
+            file.write("text")
+        self.addCleanup(os.remove, file.name)
+        os.utime(file.name, ns=(10**18, 10**18))
+        hashes = HashCache()
+        digest = hashes.hash(file.name)
+        with mock.patch("manifest.hash_file") as hash_file:
+            self.assertEqual(hashes.hash(file.name), digest)
+        hash_file.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
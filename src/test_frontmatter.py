@@ -0,0 +1,97 @@
+import io
+import os
+import unittest
+from unittest import mock
+
+from frontmatter import list_pages, read_front_matter, read_header, split_front_matter
+from main import build
+from markdown_blocks import generate_page
+from tempproject import TempProject
+
+PAGE = """---
+title: "Why Tom Bombadil Was a Mistake"
+date: 2024-05-01
+tags: [tolkien, opinion]
+draft: yes
+---
+Body text
+"""
+
+
+class TestFrontMatter(unittest.TestCase):
+    def test_fields(self):
+        meta, body = split_front_matter(PAGE)
+        self.assertEqual(meta, {
+            "title": "Why Tom Bombadil Was a Mistake",
+            "date": "2024-05-01",
+            "tags": ["tolkien", "opinion"],
+            "draft": True,
+        })
+        self.assertEqual(body, "Body text\n")
+
+    def test_list_items(self):
+        meta, _ = split_front_matter("---\ntags:\n  - a\n  - 'b c'\ndraft: false\n---\n")
+        self.assertEqual(meta, {"tags": ["a", "b c"], "draft": False})
+
+    def test_without_front_matter(self):
+        for markdown in ("# Title\n\nText", "---\ntitle: never closed\n\nText", "---\nnot a field\n---\n"):
+            self.assertEqual(split_front_matter(markdown), ({}, markdown))
+
+    def test_only_the_header_is_read(self):
+        file = io.StringIO(PAGE + "more\n" * 100000)
+        self.assertEqual(read_header(file)["date"], "2024-05-01")
+        self.assertEqual(file.tell(), PAGE.index("Body"))
+
+
+class TestFrontMatterBuild(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nHello",
+            "content/post.md": "---\ntitle: Post\ntemplate: post.html\n---\nNo heading here",
+            "content/draft.md": "---\ndraft: true\n---\n# Draft\n\nNot yet",
+            "template.html": "<title>{{ Title }}</title>{{ Content }}",
+            "post.html": "<article>{{ Title }}{{ Content }}</article>",
+        })
+
+    def build(self, **kwargs):
+        with mock.patch("sys.stdout", io.StringIO()):
+            return build(self.root, gzip=False, **kwargs)
+
+    def test_list_pages(self):
+        content_dir = os.path.join(self.root, "content")
+        self.assertEqual([path for path, _ in list_pages(content_dir)], ["index.md", "post.md"])
+        self.assertEqual(len(list(list_pages(content_dir, drafts=True))), 3)
+        self.assertEqual(read_front_matter(os.path.join(content_dir, "post.md"))["template"], "post.html")
+
+    def test_drafts_are_not_rendered(self):
+        self.assertEqual(self.build(), [])
+        self.assertFalse(os.path.exists(self.output("draft.html")))
+        self.assertEqual(self.read("post.html"), "<article>Post<div><p>No heading here</p></div></article>")
+
+        self.build(drafts=True)
+        self.assertIn("Not yet", self.read("draft.html"))
+        # Back to being a draft: its output goes
+        self.build()
+        self.assertFalse(os.path.exists(self.output("draft.html")))
+
+    def test_page_template_change_rerenders_page(self):
+        self.build()
+        mtime = os.stat(self.output("index.html")).st_mtime_ns
+        self.write("post.html", "<main>{{ Content }}</main>")
+        self.build()
+        self.assertEqual(self.read("post.html"), "<main><div><p>No heading here</p></div></main>")
+        self.assertEqual(os.stat(self.output("index.html")).st_mtime_ns, mtime)
+
+    def test_streamed_page(self):
+        dest = self.output("streamed.html")
+        with mock.patch("sys.stdout", io.StringIO()):
+            error = generate_page(
+                os.path.join(self.root, "content", "post.md"), os.path.join(self.root, "template.html"),
+                dest, "/", stream=True,
+            )
+        self.assertIsNone(error)
+        self.assertEqual(self.read("streamed.html"), "<article>Post<div><p>No heading here</p></div></article>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+import images
+from images import IMAGE_INDEX_NAME, ImageIndex, probe_image
+from main import build, process_markdown_files, rebuild_paths
+from manifest import hash_bytes, load_manifest, new_manifest, save_manifest
+from markdown_blocks import render_page
+from template import compile_template
+from tempproject import TempProject
+
+PNG = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 640, 480) + b"\x08\x06\0\0\0"
+GIF = b"GIF89a" + struct.pack("<HH", 32, 16) + b"\0" * 8
+# SOI, an APP0 segment to skip, then a baseline frame header
+JPEG = (
+    b"\xff\xd8"
+    + b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + b"\0" * 9
+    + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 300, 400) + b"\0" * 10
+)
+
+
+class TestProbeImage(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def probe(self, data):
+        path = os.path.join(self.root, "image")
+        with open(path, "wb") as file:
+            file.write(data)
+        return probe_image(path)
+
+    def test_formats(self):
+        self.assertEqual(self.probe(PNG), (640, 480))
+        self.assertEqual(self.probe(GIF), (32, 16))
+        self.assertEqual(self.probe(JPEG), (400, 300))
+
+    def test_unreadable_images(self):
+        self.assertIsNone(self.probe(b"not an image"))
+        self.assertIsNone(self.probe(PNG[:20]))
+        self.assertIsNone(self.probe(JPEG[:24]))
+        self.assertIsNone(probe_image(os.path.join(self.root, "missing.png")))
+
+
+class TestImageIndex(unittest.TestCase):
+    def setUp(self):
+        self.public_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.public_dir, "images"))
+        manifest = new_manifest()
+        manifest["static"] = {}
+        for rel_path, data in (("images/a.png", PNG), ("images/b.gif", GIF), ("index.css", b"body {}")):
+            with open(os.path.join(self.public_dir, rel_path), "wb") as file:
+                file.write(data)
+            entry = {"size": len(data), "mtime": 0}
+            if rel_path != "index.css":
+                entry["hash"] = hash_bytes(data)
+            manifest["static"][rel_path] = entry
+        save_manifest(self.public_dir, manifest)
+
+    def tearDown(self):
+        shutil.rmtree(self.public_dir)
+
+    def test_lookup(self):
+        index = ImageIndex.load(self.public_dir)
+        self.assertEqual(index.lookup("/images/a.png"), (640, 480))
+        self.assertEqual(index.lookup("/base/images/b.gif?v=2", "/base/"), (32, 16))
+        self.assertIsNone(index.lookup("/images/a.png", "/base/"))
+        self.assertIsNone(index.lookup("https://example.com/images/a.png"))
+
+    def test_sizes_are_cached_by_hash(self):
+        first = ImageIndex.load(self.public_dir)
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, IMAGE_INDEX_NAME)))
+        with mock.patch.object(images, "probe_image") as probe:
+            second = ImageIndex.load(self.public_dir)
+        probe.assert_not_called()
+        self.assertEqual(first.sizes, second.sizes)
+        self.assertEqual(first.digest, second.digest)
+
+    def test_render_page_sizes_images(self):
+        template_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, template_dir)
+        template_path = os.path.join(template_dir, "template.html")
+        with open(template_path, "w") as file:
+            file.write("{{ Content }}")
+        out = io.StringIO()
+        markdown = "# T\n\n![a](/images/a.png) and ![b](https://example.com/b.png)"
+        render_page(markdown, compile_template(template_path), out, "/", images=ImageIndex.load(self.public_dir))
+        self.assertIn('<img src="/images/a.png" alt="a" width="640" height="480" loading="lazy">', out.getvalue())
+        self.assertIn('<img src="https://example.com/b.png" alt="b" loading="lazy">', out.getvalue())
+
+
+class TestBuildImages(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "template.html": "{{ Content }}",
+            "content/index.md": "# Home\n\n![pic](/images/a.png)",
+            "content/about.md": "# About\n\nNo pictures here",
+            "static/images/a.png": PNG,
+        })
+
+    def page(self):
+        return self.read("index.html")
+
+    def write_image(self, rel_path, data):
+        self.write(os.path.join("static", "images", rel_path), data)
+
+    def build(self):
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            build(self.root, gzip=False)
+        return out.getvalue()
+
+    def test_changed_image_regenerates_pages_that_show_it(self):
+        self.build()
+        self.assertIn('width="640" height="480"', self.page())
+        self.write_image("a.png", GIF)
+        self.assertIn("Pages: 1 generated, 1 unchanged", self.build())
+        self.assertIn('width="32" height="16"', self.page())
+
+    def test_new_image_regenerates_nothing(self):
+        self.build()
+        self.write_image("b.gif", GIF)
+        self.assertIn("Pages: 0 generated, 2 unchanged", self.build())
+
+    def test_rebuild_paths_picks_up_image_sizes(self):
+        self.build()
+        self.write_image("a.png", JPEG)
+        with mock.patch("sys.stdout", io.StringIO()):
+            rebuild_paths(self.root, "/", [os.path.join(self.root, "static", "images", "a.png")], gzip=False)
+        self.assertIn('width="400" height="300"', self.page())
+
+    def test_large_page_images_are_read_block_by_block(self):
+        self.build()
+        block = "Some **bold** text with a [link](/somewhere) and ![pic](/images/a.png) in it.\n" * 20
+        self.write("content/big.md", "# Big\n\n" + (block + "\n") * 1000)
+        size = os.path.getsize(os.path.join(self.root, "content", "big.md"))
+        public_dir = os.path.join(self.root, "docs")
+        with mock.patch("markdown_blocks.STREAM_THRESHOLD", 1024), mock.patch("sys.stdout", io.StringIO()):
+            tracemalloc.start()
+            process_markdown_files(
+                os.path.join(self.root, "content"), public_dir, os.path.join(self.root, "template.html"), "/",
+            )
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.assertGreater(size, 1_000_000)
+        self.assertLess(peak, size / 4)
+        self.assertEqual(load_manifest(public_dir)["pages"]["big.md"]["images"], {"/images/a.png": [640, 480]})
+
+
+if __name__ == "__main__":
+    unittest.main()
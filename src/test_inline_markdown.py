@@ -0,0 +1,96 @@
+import random
+import unittest
+
+from inline_markdown import (
+    split_nodes_delimiter,
+    split_nodes_image,
+    split_nodes_link,
+    text_to_textnodes,
+)
+from textnode import TextNode, TextType
+
+
+def five_pass_textnodes(text):
+    # The original pipeline text_to_textnodes has to stay equivalent to
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+class TestTextToTextNodes(unittest.TestCase):
+    def assert_same_as_five_pass(self, text):
+        try:
+            expected = five_pass_textnodes(text)
+        except ValueError:
+            with self.assertRaises(ValueError):
+                text_to_textnodes(text)
+            return
+        self.assertEqual(text_to_textnodes(text), expected, text)
+
+    def test_plain_text_fast_path(self):
+        self.assertEqual(text_to_textnodes("just text"), [TextNode("just text", TextType.TEXT)])
+        self.assertEqual(text_to_textnodes(""), [])
+
+    def test_everything(self):
+        text = "This is **text** with an _italic_ word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)"
+        self.assertEqual(
+            text_to_textnodes(text),
+            [
+                TextNode("This is ", TextType.TEXT),
+                TextNode("text", TextType.BOLD),
+                TextNode(" with an ", TextType.TEXT),
+                TextNode("italic", TextType.ITALIC),
+                TextNode(" word and a ", TextType.TEXT),
+                TextNode("code block", TextType.CODE),
+                TextNode(" and an ", TextType.TEXT),
+                TextNode("obi wan image", TextType.IMAGE, "https://i.imgur.com/fJRm4Vk.jpeg"),
+                TextNode(" and a ", TextType.TEXT),
+                TextNode("link", TextType.LINK, "https://boot.dev"),
+            ],
+        )
+
+    def test_markup_inside_bold_is_left_alone(self):
+        self.assertEqual(
+            text_to_textnodes("**[not](a link)** and [a](link)"),
+            [
+                TextNode("[not](a link)", TextType.BOLD),
+                TextNode(" and ", TextType.TEXT),
+                TextNode("a", TextType.LINK, "link"),
+            ],
+        )
+
+    def test_unclosed_delimiter(self):
+        with self.assertRaises(ValueError):
+            text_to_textnodes("an _unclosed italic")
+
+    def test_adjacent_images_and_links(self):
+        for text in (
+            "![i](u)[l](v)",
+            "!![i](u)",
+            "![[x](y)",
+            "[a](b)[a](b)![a](b)",
+            "![](empty-alt.png)",
+            "[broken(link)",
+        ):
+            self.assert_same_as_five_pass(text)
+
+    def test_matches_five_pass_pipeline(self):
+        rng = random.Random(4)
+        alphabet = ["a", " ", "**", "_", "`", "[", "]", "(", ")", "!", "x y", "[t](u)", "![i](p)"]
+        for _ in range(3000):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            self.assert_same_as_five_pass(text)
+
+    def test_many_links(self):
+        text = " and ".join(f"[link {i}](/page/{i})" for i in range(500))
+        nodes = text_to_textnodes(text)
+        self.assertEqual(len(nodes), 999)
+        self.assertEqual(nodes[-1], TextNode("link 499", TextType.LINK, "/page/499"))
+
+
+if __name__ == "__main__":
+    unittest.main()
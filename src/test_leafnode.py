@@ -12,4 +12,12 @@ try:
     assert False, "Expected ValueError was not raised"
 except ValueError:
 # This is what we want
-    pass
\ No newline at end of file
+    pass
+
+# Leaves without props share one read-only mapping and carry no __dict__
+from htmlnode import EMPTY_PROPS
+leaf_node = LeafNode(tag="b", value="Bold")
+assert leaf_node.props is EMPTY_PROPS
+assert LeafNode(tag="i", value="Italic").props is leaf_node.props
+assert not hasattr(leaf_node, "__dict__")
+assert leaf_node.to_html() == "<b>Bold</b>"
@@ -0,0 +1,67 @@
+import os
+import unittest
+
+from main import process_markdown_files
+from manifest import MANIFEST_NAME, load_manifest
+from tempproject import TempProject
+
+
+class TestIncrementalBuild(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nWelcome",
+            "content/blog/post.md": "# Post\n\nSome text",
+            "template.html": "<title>{{ Title }}</title>{{ Content }}",
+        }, dirs=())
+        self.content_dir = os.path.join(self.root, "content")
+        self.public_dir = os.path.join(self.root, "docs")
+        self.template_path = os.path.join(self.root, "template.html")
+
+    def build(self, basepath="/"):
+        process_markdown_files(self.content_dir, self.public_dir, self.template_path, basepath)
+
+    def mtime(self, rel_path):
+        return os.stat(os.path.join(self.public_dir, rel_path)).st_mtime_ns
+
+    def test_manifest_written(self):
+        self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, MANIFEST_NAME)))
+        manifest = load_manifest(self.public_dir)
+        self.assertEqual(
+            sorted(manifest["pages"]),
+            [os.path.join("blog", "post.md"), "index.md"],
+        )
+        self.assertEqual(manifest["pages"]["index.md"]["output"], "index.html")
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        before = self.mtime("index.html")
+        os.utime(os.path.join(self.public_dir, "index.html"), ns=(before - 10**9, before - 10**9))
+        self.write("content/blog/post.md", "# Post\n\nEdited text")
+        self.build()
+        self.assertEqual(self.mtime("index.html"), before - 10**9)
+        self.assertIn("Edited text", self.read("blog/post.html"))
+
+    def test_template_change_invalidates_everything(self):
+        self.build()
+        self.write("template.html", "<h6>{{ Title }}</h6>{{ Content }}")
+        self.build()
+        for rel_path in ("index.html", os.path.join("blog", "post.html")):
+            self.assertTrue(self.read(rel_path).startswith("<h6>"))
+
+    def test_basepath_change_invalidates_everything(self):
+        self.write("content/index.md", "# Home\n\n[post](/blog/post)")
+        self.build()
+        self.build("/site/")
+        self.assertIn('href="/site/blog/post"', self.read("index.html"))
+
+    def test_removed_source_removes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content_dir, "blog", "post.md"))
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "blog", "post.html")))
+        self.assertNotIn(os.path.join("blog", "post.md"), load_manifest(self.public_dir)["pages"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
+import io
 import os
 import shutil
+import tempfile
+import tracemalloc
 
 from markdown_blocks import (
     markdown_to_html_node,
@@ -8,6 +11,8 @@ from markdown_blocks import (
     block_to_block_type,
     extract_title,
     generate_page,
+    iter_markdown_blocks,
+    markdown_to_html_many,
     BlockType,
 )
 
@@ -168,6 +173,151 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
         )
 
+    def test_code_with_blank_lines(self):
+        md = """
+Before
+
+```python
+def f():
+
+    return "**not bold**"
+```
+After
+"""
+        self.assertEqual(
+            markdown_to_blocks(md),
+            ["Before", '```python\ndef f():\n\n    return "**not bold**"\n```', "After"],
+        )
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(
+            html,
+            '<div><p>Before</p><pre><code>def f():\n\n    return "**not bold**"\n</code></pre><p>After</p></div>',
+        )
+
+    def test_unclosed_fence_runs_to_the_end(self):
+        html = markdown_to_html_node("```\nline\n\n- not a list").to_html()
+        self.assertEqual(html, "<div><pre><code>line\n\n- not a list\n</code></pre></div>")
+
+    def test_inline_code_line_is_not_a_fence(self):
+        self.assertEqual(block_to_block_type("```x``` and text"), BlockType.PARAGRAPH)
+
+    def test_long_ordered_list(self):
+        md = "\n".join(f"{n}. item {n}" for n in range(1, 12))
+        html = markdown_to_html_node(md).to_html()
+        self.assertIn("<li>item 10</li><li>item 11</li>", html)
+
+    def test_basepath_applies_to_links_not_code(self):
+        md = """
+See [tom](/blog/tom) and ![pic](/images/a.png)
+
+```
+<a href="/not/rewritten">
+```
+"""
+        html = markdown_to_html_node(md, "/base/").to_html()
+        self.assertEqual(
+            html,
+            '<div><p>See <a href="/base/blog/tom">tom</a> and <img src="/base/images/a.png" alt="pic"></img></p>'
+            '<pre><code><a href="/not/rewritten">\n</code></pre></div>',
+        )
+
+
+class TestMarkdownToHtmlMany(unittest.TestCase):
+    snippets = [
+        "# Hi\n\nSome **bold** and a [link](/x)",
+        "- one\n- two",
+        "",
+        "# Hi\n\n> quoted",
+    ]
+
+    def test_matches_single_rendering(self):
+        for basepath in ("/", "/base/"):
+            self.assertEqual(
+                markdown_to_html_many(self.snippets, basepath),
+                [markdown_to_html_node(md, basepath).to_html() for md in self.snippets],
+            )
+
+    def test_shares_repeated_inputs_and_blocks(self):
+        cache = {}
+        results = markdown_to_html_many(self.snippets * 3, cache=cache)
+        self.assertEqual(results, markdown_to_html_many(self.snippets) * 3)
+        # "# Hi" is rendered once for both snippets that start with it
+        self.assertEqual(len(cache), 4)
+
+    def test_errors_are_returned_in_place(self):
+        results = markdown_to_html_many(["fine", "an _unclosed italic", None])
+        self.assertEqual(results[0], "<div><p>fine</p></div>")
+        self.assertIsInstance(results[1], ValueError)
+        self.assertIsInstance(results[2], AttributeError)
+
+    def test_worker_pool(self):
+        snippets = self.snippets + ["oops _unclosed"] + [f"page {n}" for n in range(10)]
+        results = markdown_to_html_many(snippets, "/base/", jobs=2)
+        expected = markdown_to_html_many(snippets, "/base/")
+        self.assertIsInstance(results[4], ValueError)
+        self.assertEqual(results[:4] + results[5:], expected[:4] + expected[5:])
+
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_markdown_blocks_matches_markdown_to_blocks(self):
+        texts = [
+            "",
+            "one block",
+            "a\n\nb",
+            "a\n\n\nb",
+            "a\n\n\n\nb\n\n",
+            "\n\n  \n\nx  \n\n\n\n\ny\n",
+            "# Title\n\n- a\n- b\n\n```\ncode\n```\n",
+            "```\none\n\n\ntwo\n```\nafter",
+        ]
+        for text in texts:
+            self.assertEqual(
+                list(iter_markdown_blocks(io.StringIO(text))),
+                markdown_to_blocks(text),
+                text,
+            )
+
+    def test_streamed_page_matches(self):
+        root = tempfile.mkdtemp()
+        try:
+            md_path = os.path.join(root, "page.md")
+            template_path = os.path.join(root, "template.html")
+            with open(md_path, "w") as f:
+                f.write("Intro\n\n# Title\n\nSee [here](/x) and ![i](/i.png)\n\n> quote\n\n1. one\n2. two")
+            with open(template_path, "w") as f:
+                f.write('<title>{{ Title }}</title><link href="/a.css">{{ Content }}')
+            for basepath in ("/", "/base/"):
+                whole = os.path.join(root, "whole.html")
+                streamed = os.path.join(root, "streamed.html")
+                generate_page(md_path, template_path, whole, basepath, stream=False)
+                generate_page(md_path, template_path, streamed, basepath, stream=True)
+                with open(whole) as a, open(streamed) as b:
+                    self.assertEqual(a.read(), b.read())
+        finally:
+            shutil.rmtree(root)
+
+    def test_streaming_memory_is_bounded(self):
+        root = tempfile.mkdtemp()
+        try:
+            md_path = os.path.join(root, "big.md")
+            template_path = os.path.join(root, "template.html")
+            block = "Some **bold** text with a [link](/somewhere) in it.\n" * 20
+            with open(md_path, "w") as f:
+                f.write("# Big\n\n")
+                for _ in range(2000):
+                    f.write(block + "\n")
+            with open(template_path, "w") as f:
+                f.write("{{ Title }}{{ Content }}")
+            size = os.path.getsize(md_path)
+            tracemalloc.start()
+            generate_page(md_path, template_path, os.path.join(root, "big.html"), "/", stream=True)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.assertGreater(size, 2_000_000)
+            self.assertLess(peak, size / 4)
+        finally:
+            shutil.rmtree(root)
+
 def test_extract_title():
     assert extract_title("# Hello") == "Hello"
     assert extract_title("#    Spaced Out Header   ") == "Spaced Out Header"
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import os
+import unittest
+
+from main import build, rebuild_paths
+from minify import MinifyingWriter, minify_html
+from tempproject import TempProject
+
+PAGE = """<!doctype html>
+<html>
+  <head>
+    <!-- page head -->
+    <title>Hi   there</title>
+  </head>
+  <body>
+    <p>Some <b>bold</b> <i>text</i>,
+    wrapped</p><pre><code>keep   this
+  <a href="/x">as is</a>
+</code></pre><p>inline <code>a  b</code></p>
+    <script>if (a <b) { x(); }  // note
+</script>
+  </body>
+</html>
+"""
+
+EXPECTED = (
+    "<!doctype html><html><head><title>Hi there</title></head><body>"
+    "<p>Some <b>bold</b> <i>text</i>, wrapped</p><pre><code>keep   this\n"
+    '  <a href="/x">as is</a>\n</code></pre><p>inline <code>a  b</code></p>'
+    "<script>if (a <b) { x(); }  // note\n</script></body></html>"
+)
+
+
+class TestMinify(unittest.TestCase):
+    def test_minify(self):
+        self.assertEqual(minify_html(PAGE), EXPECTED)
+
+    def test_whitespace_between_inline_tags_stays_a_space(self):
+        nav = "<nav>\n  <a>Home</a>\n  <a>Blog</a>\n</nav>"
+        self.assertEqual(minify_html(nav), "<nav><a>Home</a> <a>Blog</a></nav>")
+        out = io.StringIO()
+        writer = MinifyingWriter(out)
+        for char in nav:
+            writer.write(char)
+        writer.close()
+        self.assertEqual(out.getvalue(), "<nav><a>Home</a> <a>Blog</a></nav>")
+
+    def test_removed_comment_leaves_one_space(self):
+        self.assertEqual(minify_html("<p>a <!-- c --> b</p>"), "<p>a b</p>")
+        self.assertEqual(minify_html("<p><b>a</b>\n<!-- c -->\n<i>b</i></p>"), "<p><b>a</b> <i>b</i></p>")
+
+    def test_any_chunking_gives_the_same_output(self):
+        for size in (1, 2, 3, 7, 64):
+            out = io.StringIO()
+            writer = MinifyingWriter(out)
+            for start in range(0, len(PAGE), size):
+                writer.write(PAGE[start:start + size])
+            writer.close()
+            self.assertEqual(out.getvalue(), EXPECTED, size)
+            self.assertEqual(writer.bytes_in, len(PAGE.encode()))
+            self.assertEqual(writer.bytes_out, len(EXPECTED.encode()))
+
+
+class TestBuildMinified(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\n```\nindented\n    code\n```",
+            "template.html": "<html>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n",
+        })
+
+    def build(self, minify):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            build(self.root, minify=minify)
+        return out.getvalue(), self.read("index.html")
+
+    def test_minified_build(self):
+        log, html = self.build(minify=True)
+        self.assertEqual(html, "<html><body><div><h1>Home</h1><pre><code>indented\n    code\n</code></pre></div></body></html>")
+        self.assertIn("Minify: saved 13 B", log)
+        # A rebuild of the edited page stays minified
+        md_path = os.path.join(self.root, "content", "index.md")
+        with open(md_path, "w") as file:
+            file.write("# Home\n\nEdited")
+        with contextlib.redirect_stdout(io.StringIO()):
+            rebuild_paths(self.root, "/", [md_path], gzip=False, minify=True)
+        with open(os.path.join(self.root, "docs", "index.html")) as file:
+            self.assertEqual(file.read(), "<html><body><div><h1>Home</h1><p>Edited</p></div></body></html>")
+        # Turning it off regenerates the page
+        log, html = self.build(minify=False)
+        self.assertIn("Pages: 1 generated", log)
+        self.assertTrue(html.startswith("<html>\n  <body>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from main import build
+from output import ADDED, CHANGED, CHANGES_NAME, UNCHANGED, AtomicFile, ChangeSet
+from tempproject import TempProject
+
+
+class TestAtomicFile(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "page.html")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, text):
+        output = AtomicFile(self.path)
+        with output as file:
+            file.write(text)
+        return output.status
+
+    def test_statuses(self):
+        self.assertEqual(self.write("<p>one</p>"), ADDED)
+        self.assertEqual(self.write("<p>one</p>"), UNCHANGED)
+        self.assertEqual(self.write("<p>two</p>"), CHANGED)
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "<p>two</p>")
+
+    def test_identical_output_keeps_mtime(self):
+        self.write("<p>one</p>")
+        os.utime(self.path, ns=(1, 1))
+        self.write("<p>one</p>")
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 1)
+
+    def test_failed_write_leaves_no_trace(self):
+        self.write("<p>one</p>")
+        with self.assertRaises(RuntimeError):
+            with AtomicFile(self.path) as file:
+                file.write("<p>half")
+                raise RuntimeError("render failed")
+        self.assertEqual(os.listdir(self.root), ["page.html"])
+        with open(self.path) as file:
+            self.assertEqual(file.read(), "<p>one</p>")
+
+
+class TestChangeSet(unittest.TestCase):
+    def test_to_dict_is_relative_and_sorted(self):
+        changes = ChangeSet()
+        changes.record("/site/b.html", ADDED)
+        changes.record("/site/a.html", ADDED)
+        changes.record("/site/c.html", CHANGED)
+        changes.record("/site/d.html", UNCHANGED)
+        changes.record_removed("/site/old/e.html")
+        self.assertEqual(
+            changes.to_dict("/site"),
+            {"added": ["a.html", "b.html"], "changed": ["c.html"], "removed": ["old/e.html"]},
+        )
+        self.assertEqual(changes.summary(), "2 added, 1 changed, 1 removed")
+
+
+class TestBuildChanges(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nHello",
+            "content/about.md": "# About\n\nUs",
+            "static/index.css": "body {}",
+            "template.html": "<html><body>{{ Content }}</body></html>",
+        })
+
+    def changes(self):
+        # Pages and static files only; the search index has its own tests
+        changes = json.loads(self.read(CHANGES_NAME))
+        return {kind: [path for path in paths if not path.startswith("search/")] for kind, paths in changes.items()}
+
+    def test_build_lists_changed_outputs(self):
+        build(self.root)
+        self.assertEqual(self.changes()["added"], ["about.html", "index.css", "index.html"])
+
+        build(self.root)
+        self.assertEqual(self.changes(), {"added": [], "changed": [], "removed": []})
+
+        self.write("content/index.md", "# Home\n\nHello again")
+        os.remove(os.path.join(self.root, "content", "about.md"))
+        build(self.root)
+        self.assertEqual(self.changes(), {"added": [], "changed": ["index.html"], "removed": ["about.html"]})
+
+    def test_removed_page_takes_its_sidecar_and_directory(self):
+        self.write("content/blog/tom/index.md", "# Tom\n\n" + "Hey dol! merry dol! " * 100)
+        build(self.root)
+        self.assertTrue(os.path.exists(self.output("blog/tom/index.html.gz")))
+
+        shutil.rmtree(os.path.join(self.root, "content", "blog"))
+        build(self.root)
+        self.assertFalse(os.path.exists(self.output("blog")))
+        self.assertEqual(self.changes()["removed"], ["blog/tom/index.html", "blog/tom/index.html.gz"])
+
+    def test_build_without_gzip_drops_stale_sidecars(self):
+        self.write("content/index.md", "# Home\n\n" + "Hello " * 300)
+        self.write("content/about.md", "# About\n\n" + "Us " * 600)
+        build(self.root)
+        self.write("content/index.md", "# Home\n\n" + "Hello again " * 300)
+        build(self.root, gzip=False)
+        self.assertFalse(os.path.exists(self.output("index.html.gz")))
+        self.assertTrue(os.path.exists(self.output("about.html.gz")))
+        self.assertIn("index.html.gz", self.changes()["removed"])
+
+        # The next compressing build writes it again
+        build(self.root)
+        with gzip.open(self.output("index.html.gz"), "rt") as file:
+            self.assertIn("Hello again", file.read())
+
+    def test_rerendered_identical_page_is_not_changed(self):
+        build(self.root)
+        # Same rendered output from a touched-up source: no rewrite
+        self.write("content/index.md", "# Home\n\nHello\n")
+        build(self.root)
+        self.assertEqual(self.changes()["changed"], [])
+
+
+    def test_output_moving_between_static_and_content_is_kept(self):
+        self.write("static/contact.html", "<p>static</p>")
+        build(self.root)
+        # The page is written before the orphaned static file would be pruned
+        os.remove(os.path.join(self.root, "static", "contact.html"))
+        self.write("content/contact.md", "# Contact\n\nMail")
+        build(self.root)
+        self.assertIn("Mail", self.read("contact.html"))
+
+        os.remove(os.path.join(self.root, "content", "contact.md"))
+        self.write("static/contact.html", "<p>static again</p>")
+        build(self.root)
+        self.assertEqual(self.read("contact.html"), "<p>static again</p>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import unittest
+
+from main import process_markdown_files
+from parallel import BATCH_FILES, make_batches
+from tempproject import TempProject
+
+
+class TestMakeBatches(unittest.TestCase):
+    def test_small_files_are_grouped(self):
+        pages = [(f"{i}.md", f"{i}.html", 10) for i in range(200)]
+        batches = make_batches(pages, 2)
+        self.assertLess(len(batches), len(pages))
+        self.assertTrue(all(len(batch) <= BATCH_FILES for batch in batches))
+        self.assertEqual(sum(len(batch) for batch in batches), len(pages))
+
+    def test_order_is_preserved(self):
+        pages = [(f"{i}.md", f"{i}.html", 1000) for i in range(10)]
+        flattened = [md for batch in make_batches(pages, 4) for md, _ in batch]
+        self.assertEqual(flattened, [md for md, _, _ in pages])
+
+
+class TestParallelBuild(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({"template.html": '<title>{{ Title }}</title><a href="/x">x</a>{{ Content }}'}, dirs=())
+        self.content_dir = os.path.join(self.root, "content")
+        self.template_path = os.path.join(self.root, "template.html")
+        for i in range(12):
+            markdown = f"# Page {i}\n\nSome **bold** and a [link](/page{i + 1}).\n\n- a\n- b"
+            self.write(f"content/page{i}/index.md", markdown)
+
+    def read_tree(self, public_dir):
+        pages = {}
+        for root, _, files in os.walk(public_dir):
+            for file in files:
+                if file.endswith(".html"):
+                    path = os.path.join(root, file)
+                    with open(path, "rb") as f:
+                        pages[os.path.relpath(path, public_dir)] = f.read()
+        return pages
+
+    def test_parallel_output_matches_serial(self):
+        serial_dir = os.path.join(self.root, "serial")
+        parallel_dir = os.path.join(self.root, "parallel")
+        self.assertEqual(process_markdown_files(self.content_dir, serial_dir, self.template_path, "/base/"), [])
+        self.assertEqual(process_markdown_files(self.content_dir, parallel_dir, self.template_path, "/base/", jobs=3), [])
+        serial = self.read_tree(serial_dir)
+        self.assertEqual(len(serial), 12)
+        self.assertEqual(serial, self.read_tree(parallel_dir))
+
+    def test_errors_are_reported_per_file(self):
+        self.write("content/page3/index.md", "# Broken\n\nThis **never closes")
+        public_dir = os.path.join(self.root, "docs")
+        failed = process_markdown_files(self.content_dir, public_dir, self.template_path, "/", jobs=2)
+        self.assertEqual([os.path.relpath(md, self.content_dir) for md, _ in failed], [os.path.join("page3", "index.md")])
+        self.assertIn("ValueError", failed[0][1])
+        self.assertEqual(len(self.read_tree(public_dir)), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()
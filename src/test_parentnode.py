@@ -1,5 +1,7 @@
-from parentnode import ParentNode
+from parentnode import ParentNode, write_html
 from leafnode import LeafNode
+import io
+import sys
 import unittest
 
 class TestParentNode(unittest.TestCase):
@@ -51,4 +53,43 @@ class TestParentNode(unittest.TestCase):
 
     def test_to_html_empty_children(self):
         parent_node = ParentNode("div", [])
-        self.assertEqual(parent_node.to_html(), "<div></div>")
\ No newline at end of file
+        self.assertEqual(parent_node.to_html(), "<div></div>")
+
+class TestWriteHTML(unittest.TestCase):
+    def make_tree(self):
+        return ParentNode("div", [
+            ParentNode("p", [LeafNode("b", "Bold"), LeafNode(None, " text")], {"class": "intro"}),
+            ParentNode("ul", []),
+            LeafNode("a", "link", {"href": "/x"}),
+        ])
+
+    def test_list_sink(self):
+        tree = self.make_tree()
+        parts = []
+        write_html(tree, parts)
+        self.assertEqual(
+            "".join(parts),
+            '<div><p class="intro"><b>Bold</b> text</p><ul></ul><a href="/x">link</a></div>',
+        )
+        self.assertGreater(len(parts), 1)
+
+    def test_file_sink_matches_to_html(self):
+        tree = self.make_tree()
+        out = io.StringIO()
+        write_html(tree, out)
+        self.assertEqual(out.getvalue(), tree.to_html())
+
+    def test_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() + 100
+        node = LeafNode(None, "bottom")
+        for _ in range(depth):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span>" * depth + "bottom"))
+        self.assertTrue(html.endswith("</span>" * depth))
+
+    def test_missing_tag(self):
+        node = ParentNode("div", [LeafNode(None, "x")])
+        node.tag = None
+        with self.assertRaises(ValueError):
+            write_html(node, [])
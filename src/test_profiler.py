@@ -0,0 +1,50 @@
+import time
+import unittest
+
+import profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def test_inactive_is_no_op(self):
+        self.assertFalse(profiler.is_active())
+        with profiler.stage("anything"), profiler.page("page.md"):
+            pass
+        items = [1, 2]
+        self.assertIs(profiler.timed_iter("walk", items), items)
+
+    def test_nested_stages(self):
+        prof = profiler.Profiler()
+        prof.start()
+        try:
+            with profiler.stage("outer"):
+                with profiler.page("a.md"):
+                    with profiler.stage("inner"):
+                        time.sleep(0.02)
+                        data = [0] * 500_000
+                    del data
+                with profiler.stage("inner"):
+                    pass
+            for _ in profiler.timed_iter("walk", range(3)):
+                pass
+        finally:
+            prof.stop()
+        self.assertFalse(profiler.is_active())
+
+        calls, total, own, peak = prof.stages["inner"]
+        self.assertEqual(calls, 2)
+        self.assertGreaterEqual(total, 0.02)
+        self.assertGreater(peak, 4_000_000)
+        outer = prof.stages["outer"]
+        self.assertGreaterEqual(outer[1], total)
+        self.assertLess(outer[2], 0.02)
+        # the page's peak includes the stage inside it
+        self.assertGreater(prof.pages["a.md"][1], 4_000_000)
+        self.assertEqual(prof.stages["walk"][0], 4)
+
+        report = prof.report(top=5)
+        self.assertIn("inner", report)
+        self.assertIn("a.md", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
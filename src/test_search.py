@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import subprocess
+import unittest
+from collections import Counter
+
+from main import build
+from markdown_blocks import markdown_to_html_node
+from search import SEARCH_DIR, add_terms, page_url, tokenize
+from tempproject import TempProject
+
+
+class TestTokenize(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(list(tokenize("The Lord of the Rings, 1954!")), ["lord", "rings", "1954"])
+
+    def test_terms_come_from_text_and_alt(self):
+        node = markdown_to_html_node("# Tom\n\nTom is **merry**\n\n![Old Tom](/tom.png)")
+        self.assertEqual(add_terms(node, Counter()), Counter({"tom": 3, "merry": 1, "old": 1}))
+
+    def test_page_url(self):
+        self.assertEqual(page_url("index.html", "/"), "/")
+        self.assertEqual(page_url(os.path.join("blog", "tom", "index.html"), "/site/"), "/site/blog/tom/")
+        self.assertEqual(page_url("about.html", "/"), "/about.html")
+
+
+class TestSearchIndex(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nWelcome hobbits",
+            "content/blog/tom.md": "# Tom\n\nTom Bombadil sings",
+            "template.html": "<html><body>{{ Content }}</body></html>",
+        })
+
+    def search_path(self, rel_path):
+        return self.output(os.path.join(SEARCH_DIR, rel_path))
+
+    def read_json(self, rel_path):
+        # A file of the search index, relative to its directory
+        with open(self.search_path(rel_path)) as file:
+            return json.load(file)
+
+    def shard_mtime(self, prefix):
+        return os.stat(self.search_path(f"index/{prefix}.json")).st_mtime_ns
+
+    def test_index_is_sharded_by_prefix(self):
+        build(self.root, "/site/")
+        docs = self.read_json("docs.json")
+        self.assertEqual(sorted(docs.values()), [["/site/", "Home"], ["/site/blog/tom.html", "Tom"]])
+        tom_id = next(doc_id for doc_id, (url, _) in docs.items() if url.endswith("tom.html"))
+        self.assertEqual(self.read_json("index/to.json"), {"tom": [[int(tom_id), 2]]})
+        self.assertIn("hobbits", self.read_json("index/ho.json"))
+        self.assertTrue(os.path.exists(self.search_path("search.js")))
+
+    def test_only_affected_shards_are_rewritten(self):
+        build(self.root)
+        os.utime(self.search_path("index/to.json"), ns=(1, 1))
+        self.write("content/index.md", "# Home\n\nWelcome elves")
+        build(self.root)
+        self.assertEqual(self.shard_mtime("to"), 1)
+        self.assertIn("elves", self.read_json("index/el.json"))
+        self.assertNotIn("hobbits", self.read_json("index/ho.json"))
+
+    def test_removed_page_leaves_the_index(self):
+        build(self.root)
+        os.remove(os.path.join(self.root, "content", "blog", "tom.md"))
+        build(self.root)
+        self.assertEqual(list(self.read_json("docs.json").values()), [["/", "Home"]])
+        self.assertFalse(os.path.exists(self.search_path("index/to.json")))
+
+    def test_lost_index_is_rebuilt_without_a_full_render(self):
+        build(self.root)
+        shutil.rmtree(self.output(SEARCH_DIR))
+        build(self.root)
+        self.assertEqual(len(self.read_json("docs.json")), 2)
+
+    def test_parallel_build_matches_serial_build(self):
+        for name in ("a", "b", "c", "d", "e"):
+            self.write(f"content/blog/{name}.md", f"# Post {name}\n\nWords about {name} and hobbits")
+        build(self.root, jobs=4)
+        parallel = {name: self.read_bytes(name) for name in self.search_files()}
+        shutil.rmtree(os.path.join(self.root, "docs"))
+        build(self.root)
+        self.assertEqual({name: self.read_bytes(name) for name in self.search_files()}, parallel)
+
+    def search_files(self):
+        search_dir = self.output(SEARCH_DIR)
+        return sorted(
+            os.path.relpath(os.path.join(root, file), search_dir)
+            for root, _, files in os.walk(search_dir) for file in files
+        )
+
+    def read_bytes(self, rel_path):
+        with open(self.search_path(rel_path), "rb") as file:
+            return file.read()
+
+
+# Runs the generated search.js against the files of a build, fetching from disk
+NODE_HARNESS = """
+const fs = require("fs");
+const script = process.argv[1];
+global.window = global;
+global.document = {currentScript: {src: "file://" + script}};
+global.fetch = (url) => {
+  const path = url.slice("file://".length);
+  const ok = fs.existsSync(path);
+  return Promise.resolve({ok: ok, json: () => Promise.resolve(JSON.parse(fs.readFileSync(path, "utf8")))});
+};
+eval(fs.readFileSync(script, "utf8"));
+Promise.all(JSON.parse(process.argv[2]).map((query) => search(query)))
+  .then((results) => console.log(JSON.stringify(results.map((hits) => hits.map((hit) => hit.url)))));
+"""
+
+
+@unittest.skipUnless(shutil.which("node"), "needs node to run search.js")
+class TestSearchScript(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nThe Lord of the Rings",
+            "content/blog/tom.md": "# Tom\n\nTom sings in the Old Forest",
+            "template.html": "{{ Content }}",
+        })
+        build(self.root)
+
+    def search(self, *queries):
+        script = self.output(os.path.join(SEARCH_DIR, "search.js"))
+        result = subprocess.run(
+            ["node", "-e", NODE_HARNESS, script, json.dumps(queries)],
+            capture_output=True, text=True, timeout=30, check=True,
+        )
+        return json.loads(result.stdout)
+
+    def test_queries_skip_stop_words(self):
+        self.assertEqual(
+            self.search("rings", "the rings", "lord of the rings", "tom in the forest", "the", "rings tom"),
+            [["/"], ["/"], ["/"], ["/blog/tom.html"], [], []],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import functools
+import os
+import struct
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+from main import build
+from server import (
+    RELOAD_PATH,
+    DevRequestHandler,
+    PageCache,
+    PreviewRequestHandler,
+    Previewer,
+    ReloadBroadcaster,
+    RenderedPage,
+    Watcher,
+)
+from tempproject import TempProject
+
+
+class TestDevServer(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nFirst version",
+            "content/blog/index.md": "# Blog\n\nPosts",
+            "static/index.css": "body {}",
+            "template.html": "<html><body>{{ Content }}</body></html>",
+        })
+        build(self.root)
+
+        self.reloads = ReloadBroadcaster()
+        handler = functools.partial(DevRequestHandler, directory=os.path.join(self.root, "docs"))
+        handler.log_message = lambda *args: None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.reloads = self.reloads
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetch(self, path):
+        with urllib.request.urlopen(self.base_url + path, timeout=5) as response:
+            return response.read().decode()
+
+    def test_reload_script_is_injected(self):
+        html = self.fetch("/")
+        self.assertIn(RELOAD_PATH, html)
+        self.assertLess(html.index(RELOAD_PATH), html.index("</body>"))
+        self.assertNotIn(RELOAD_PATH, self.read("index.html"))
+        self.assertEqual(self.fetch("/index.css"), "body {}")
+
+    def test_edit_rebuilds_page_and_pushes_reload(self):
+        watcher = Watcher(self.root, "/", self.reloads, interval=0.01)
+        self.addCleanup(watcher.stop)
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        events = urllib.request.urlopen(self.base_url + RELOAD_PATH, timeout=5)
+        self.assertEqual(events.headers["Content-Type"], "text/event-stream")
+
+        blog_html = self.output("blog/index.html")
+        blog_mtime = os.stat(blog_html).st_mtime_ns
+        self.write("content/index.md", "# Home\n\nSecond version, a bit longer")
+        self.assertEqual(events.readline(), b"data: reload\n")
+        events.close()
+
+        self.assertIn("Second version", self.fetch("/"))
+        # Only the edited page was regenerated
+        self.assertEqual(os.stat(blog_html).st_mtime_ns, blog_mtime)
+        # Don't let a rebuild still in progress race tearDown's rmtree
+        watcher.stop()
+        thread.join(5)
+        # The heading came from the blocks the watcher keeps in memory
+        self.assertEqual(watcher.blocks.summary(), "1 reused, 1 rendered")
+
+
+class TestOnDemandServer(TempProject, unittest.TestCase):
+    def setUp(self):
+        self.make_project({
+            "content/index.md": "# Home\n\nSee [blog](/blog/)",
+            "content/blog/index.md": "# Blog\n\nPosts",
+            "content/about.md": "# About\n\nUs",
+            "static/index.css": "body {}",
+            "template.html": '<html><link href="/index.css">{{ Content }}</html>',
+        })
+
+        handler = functools.partial(PreviewRequestHandler, directory=os.path.join(self.root, "static"))
+        handler.log_message = lambda *args: None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.previewer = Previewer(self.root, "/site/")
+        self.server.previewer = self.previewer
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request(self, path, headers=None):
+        request = urllib.request.Request(self.base_url + path, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, response.headers, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, ""
+
+    def test_pages_are_rendered_once_and_cached(self):
+        status, _, html = self.request("/site/")
+        self.assertEqual(status, 200)
+        self.assertEqual(html, '<html><link href="/site/index.css"><div><h1>Home</h1><p>See <a href="/site/blog/">blog</a></p></div></html>')
+        self.request("/site/")
+        self.assertEqual(self.previewer.renders, 1)
+        self.assertIn("Posts", self.request("/site/blog/")[2])
+        self.assertIn("Us", self.request("/site/about.html")[2])
+        self.assertFalse(os.path.exists(os.path.join(self.root, "docs")))
+
+    def test_static_files_and_missing_pages(self):
+        self.assertEqual(self.request("/site/index.css")[2], "body {}")
+        self.assertEqual(self.request("/site/nope.html")[0], 404)
+        self.assertEqual(self.request("/site/../template.html")[0], 404)
+
+    def test_directory_without_slash_redirects(self):
+        status, _, html = self.request("/site/blog")
+        self.assertEqual(status, 200)
+        self.assertIn("Posts", html)
+
+    def test_edits_invalidate_the_cache(self):
+        self.request("/site/about.html")
+        md_path = os.path.join(self.root, "content", "about.md")
+        # Touched but unchanged: still served from the cache
+        os.utime(md_path, ns=(1, 1))
+        self.request("/site/about.html")
+        self.assertEqual(self.previewer.renders, 1)
+        self.write("content/about.md", "# About\n\nUs and them")
+        self.assertIn("Us and them", self.request("/site/about.html")[2])
+        self.assertEqual(self.previewer.renders, 2)
+
+    def test_images_are_sized_like_the_build(self):
+        self.write("static/images/a.gif", b"GIF89a" + struct.pack("<HH", 32, 16))
+        self.write("content/about.md", "# About\n\n![us](/images/a.gif)")
+        self.assertIn(
+            '<img src="/site/images/a.gif" alt="us" width="32" height="16" loading="lazy">',
+            self.request("/site/about.html")[2],
+        )
+        # A new size for the image means a new page
+        self.write("static/images/a.gif", b"GIF89a" + struct.pack("<HH", 64, 8))
+        self.assertIn('width="64" height="8"', self.request("/site/about.html")[2])
+        self.assertEqual(self.previewer.renders, 2)
+
+    def test_conditional_requests(self):
+        _, headers, _ = self.request("/site/")
+        etag, last_modified = headers["ETag"], headers["Last-Modified"]
+        self.assertEqual(self.request("/site/", {"If-None-Match": etag})[0], 304)
+        self.assertEqual(self.request("/site/", {"If-Modified-Since": last_modified})[0], 304)
+        self.assertEqual(self.request("/site/", {"If-None-Match": '"other"'})[0], 200)
+        self.write("content/index.md", "# Home\n\nNew")
+        self.assertEqual(self.request("/site/", {"If-None-Match": etag})[0], 200)
+
+
+class TestPageCache(unittest.TestCase):
+    def page(self, size):
+        return RenderedPage((0, size), "hash", "digest", {}, b"x" * size, 0)
+
+    def test_least_recently_used_is_dropped(self):
+        cache = PageCache(max_bytes=250)
+        cache.put("a", self.page(100))
+        cache.put("b", self.page(100))
+        cache.get("a")
+        cache.put("c", self.page(100))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.size, 200)
+        # Too big to ever fit
+        cache.put("d", self.page(300))
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
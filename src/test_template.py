@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from template import apply_basepath, compile_template, load_template
+
+
+class TestTemplate(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        with open(path, "w") as file:
+            file.write(text)
+        return path
+
+    def test_segments(self):
+        path = self.write("t.html", "<title>{{ Title }}</title><body>{{ Content }}</body>")
+        template = compile_template(path)
+        self.assertEqual(
+            template.segments,
+            [
+                (False, "<title>"),
+                (True, "Title"),
+                (False, "</title><body>"),
+                (True, "Content"),
+                (False, "</body>"),
+            ],
+        )
+
+    def test_render(self):
+        path = self.write("t.html", "<title>{{ Title }}</title>{{ Content }}{{ Missing }}")
+        html = compile_template(path).render_to_string({"Title": "Hi", "Content": "<p>x</p>"})
+        self.assertEqual(html, "<title>Hi</title><p>x</p>{{ Missing }}")
+
+    def test_partials(self):
+        self.write("head.html", '<link href="/index.css" />')
+        self.write("nav.html", "<nav>{{ Title }}</nav>")
+        path = self.write("t.html", "<head>{{> head }}</head>{{> nav.html }}{{ Content }}")
+        template = compile_template(path)
+        self.assertEqual(
+            template.render_to_string({"Title": "T", "Content": "C"}, "/base/"),
+            '<head><link href="/base/index.css" /></head><nav>T</nav>C',
+        )
+        self.assertEqual(len(template.dependencies), 3)
+
+    def test_recursive_partial(self):
+        self.write("a.html", "{{> b }}")
+        self.write("b.html", "{{> a }}")
+        with self.assertRaises(ValueError):
+            compile_template(os.path.join(self.root, "a.html"))
+
+    def test_cache_reloads_on_change(self):
+        self.write("part.html", "one")
+        path = self.write("t.html", "{{> part }}")
+        first = load_template(path)
+        self.assertIs(load_template(path), first)
+        self.write("part.html", "two!")
+        second = load_template(path)
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.digest, first.digest)
+        self.assertEqual(second.render_to_string({}), "two!")
+
+    def test_apply_basepath(self):
+        html = '<a href="/x">x</a><img src="/i.png" /><a href="https://a.b/">y</a>'
+        self.assertEqual(apply_basepath(html, "/"), html)
+        self.assertEqual(
+            apply_basepath(html, "/s/"),
+            '<a href="/s/x">x</a><img src="/s/i.png" /><a href="https://a.b/">y</a>',
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
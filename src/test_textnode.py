@@ -56,6 +56,14 @@ class TestTextNode(unittest.TestCase):
         self.assertEqual(html_node.tag, "i")
         self.assertEqual(html_node.value, "This is an italics node")
 
+    def test_basepath(self):
+        link = text_node_to_html_node(TextNode("Link", TextType.LINK, "/blog/tom"), "/HTML_Boot/")
+        self.assertEqual(link.props["href"], "/HTML_Boot/blog/tom")
+        image = text_node_to_html_node(TextNode("Img", TextType.IMAGE, "/images/a.png"), "/HTML_Boot/")
+        self.assertEqual(image.props["src"], "/HTML_Boot/images/a.png")
+        external = text_node_to_html_node(TextNode("Ext", TextType.LINK, "https://boot.dev/"), "/HTML_Boot/")
+        self.assertEqual(external.props["href"], "https://boot.dev/")
+
 def test_code(self):
         node = TextNode("This is a code node", TextType.CODE)
         html_node = text_node_to_html_node(node)
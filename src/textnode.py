@@ -10,6 +10,8 @@ class TextType(Enum):
     IMAGE = "IMAGE"
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -30,7 +32,13 @@ class TextNode:
     def __repr__(self):
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
     
-def text_node_to_html_node(text_node):
+def with_basepath(url, basepath):
+    # Root-relative URLs get the site's basepath; everything else is left alone
+    if basepath != "/" and url.startswith("/"):
+        return basepath + url[1:]
+    return url
+
+def text_node_to_html_node(text_node, basepath="/"):
     match text_node.text_type:
         case TextType.TEXT:
             return LeafNode(None, text_node.text)
@@ -41,8 +49,8 @@ def text_node_to_html_node(text_node):
         case TextType.CODE:
             return LeafNode("code", text_node.text)
         case TextType.LINK:
-            return LeafNode("a", text_node.text, {"href": text_node.url})
+            return LeafNode("a", text_node.text, {"href": with_basepath(text_node.url, basepath)})
         case TextType.IMAGE:
-            return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+            return LeafNode("img", "", {"src": with_basepath(text_node.url, basepath), "alt": text_node.text})
         case _:
             raise Exception(f"Invalid text type: {text_node.text_type}")
\ No newline at end of file